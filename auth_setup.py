@@ -11,16 +11,13 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 
-CONFIG_DIR = Path.home() / ".config" / "obs-yt-clipper"
-DEFAULT_CREDENTIALS_PATH = CONFIG_DIR / "credentials.json"
-DEFAULT_TOKEN_PATH = CONFIG_DIR / "token.json"
-
 
 def main():
     print("=== OBS YouTube Clip Uploader - OAuth Setup ===\n")
 
-    credentials_path = DEFAULT_CREDENTIALS_PATH
-    token_path = DEFAULT_TOKEN_PATH
+    config_dir = Path.home() / ".config" / "obs-yt-clipper"
+    credentials_path = config_dir / "credentials.json"
+    token_path = config_dir / "token.json"
 
     if not credentials_path.exists():
         print(f"ERROR: Credentials file not found at: {credentials_path}")
@@ -35,7 +32,7 @@ def main():
         print("\nThen run this script again.")
         sys.exit(1)
 
-    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    config_dir.mkdir(parents=True, exist_ok=True)
 
     print(f"Using credentials from: {credentials_path}")
     print("\nThis will open a browser window for you to authorize the application.")
@@ -2,21 +2,30 @@
 OBS Python Script: Automatically upload replay buffer clips to YouTube.
 
 This script hooks into OBS's replay buffer save event, detects the active game,
-renames the clip, and spawns upload_clip.py as a detached subprocess.
+renames the clip, and queues it on a long-lived upload_clip.py --daemon
+subprocess (started on the first replay save).
 
 To install:
 1. Copy this file to your OBS scripts folder or add it via Tools > Scripts
 2. Configure the upload script path in the script settings
 """
 
+import functools
+import json
 import os
 import subprocess
 import re
+import threading
 from datetime import datetime
 from pathlib import Path
 
 import obspython as obs
 
+try:
+    from Xlib import X, display as xdisplay
+except ImportError:  # python-xlib is optional; xdotool is used without it
+    X = xdisplay = None
+
 # Script settings (configured via OBS UI)
 upload_script_path = ""
 python_executable = "python3"
@@ -47,6 +56,51 @@ GAME_NAME_MAP = {
     "lutris": "Game",
 }
 
+# Single alternation over every GAME_NAME_MAP pattern, built once at load.
+# Patterns are ordered longest first so the most specific match wins (e.g.
+# "r5apex" over "apex", or a game's own name over "steam"); ties keep map
+# order. The lookahead makes finditer report a match at every position, so
+# overlapping patterns are all seen.
+_GAME_PATTERNS = sorted(GAME_NAME_MAP, key=lambda pattern: -len(pattern))
+_GAME_PATTERN_PRIORITY = {pattern: i for i, pattern in enumerate(_GAME_PATTERNS)}
+_GAME_PATTERN_RE = re.compile(
+    "(?=(" + "|".join(re.escape(pattern) for pattern in _GAME_PATTERNS) + "))"
+)
+
+# Window title cleanup patterns
+_INVIS_RE = re.compile(r'[\u200b-\u200f\u2028-\u202f\u2060-\u206f\ufeff]')
+_SUBTITLE_RE = re.compile(r"\s*[-–]\s*.*$")
+_PARENS_RE = re.compile(r"\s*\(.*?\)\s*")
+_VERSION_RE = re.compile(r"\s*v?\d+\.\d+.*$")
+
+# Window titles containing any of these are apps, not games
+_NOT_A_GAME_RE = re.compile(r"obs|chrome|firefox|terminal|code")
+
+# Serializes replay handling so rapid saves don't race on the rename
+_replay_lock = threading.Lock()
+
+# Environment for host commands, built once: xdotool needs DISPLAY set
+_HOST_ENV = {**os.environ}
+_HOST_ENV.setdefault("DISPLAY", ":0")
+
+# Inside a Flatpak sandbox, host commands go through flatpak-spawn
+_IS_FLATPAK = os.path.exists("/.flatpak-info")
+
+# X connection reused across queries when python-xlib is available
+_x_display = None
+
+# Where a process's name is read from; tests point this at a temp file
+_PROC_COMM_PATH = "/proc/{pid}/comm"
+
+# Sound played when a clip is saved, resolved once at load
+_AUDIO_FILE = str(Path(__file__).parent / "sounds" / "clip_saved.wav")
+_AUDIO_FILE_OK = os.path.exists(_AUDIO_FILE)
+
+# Long-lived upload_clip.py --daemon process, started on the first replay save
+_daemon_proc = None
+_daemon_argv = None
+_daemon_lock = threading.Lock()
+
 
 def script_description():
     return """<h2>OBS YouTube Clip Uploader</h2>
@@ -104,98 +158,189 @@ def script_load(settings):
 
 
 def script_unload():
+    _stop_upload_daemon()
+    _close_x_display()
+    _resolve_game_name.cache_clear()
     obs.script_log(obs.LOG_INFO, "OBS YouTube Clip Uploader unloaded")
 
 
 def on_frontend_event(event):
     if event == obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED:
-        handle_replay_saved()
+        # Ask OBS for the saved file now, before a later save can replace it
+        replay_file = get_last_replay_path()
+        # Runs on the OBS frontend thread; hand off so the UI isn't blocked
+        # on game detection, the rename, and spawning the upload
+        threading.Thread(
+            target=_handle_replay_saved_serialized,
+            args=(replay_file,),
+            daemon=True,
+            name="clip-hook",
+        ).start()
+
+
+def _handle_replay_saved_serialized(replay_file: str = ""):
+    """Handle a replay save, one at a time."""
+    with _replay_lock:
+        handle_replay_saved(replay_file)
+
+
+def _host_command(cmd: list) -> tuple:
+    """Build the argv and environment to run a command on the host."""
+    if _IS_FLATPAK:
+        cmd = ["flatpak-spawn", "--host"] + cmd
+    return cmd, _HOST_ENV
 
 
 def _run_host_command(cmd: list) -> subprocess.CompletedProcess:
-    """Run a command, using flatpak-spawn if inside a Flatpak sandbox."""
-    env = os.environ.copy()
-    if "DISPLAY" not in env:
-        env["DISPLAY"] = ":0"
+    """Run a command and capture its output, using flatpak-spawn if inside a Flatpak sandbox."""
+    cmd, env = _host_command(cmd)
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=2, env=env)
 
-    # Check if we're inside a Flatpak
-    if os.path.exists("/.flatpak-info"):
-        cmd = ["flatpak-spawn", "--host"] + cmd
 
-    return subprocess.run(cmd, capture_output=True, text=True, timeout=2, env=env)
+def _spawn_host_command(cmd: list) -> subprocess.Popen:
+    """Start a command in the background without waiting for it or reading its output."""
+    cmd, env = _host_command(cmd)
+    return subprocess.Popen(
+        cmd,
+        start_new_session=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+    )
 
 
 def play_audio_cue():
     """Play a notification sound when clip is saved."""
-    script_dir = Path(__file__).parent
-    audio_file = script_dir / "sounds" / "clip_saved.wav"
-
-    if not audio_file.exists():
-        obs.script_log(obs.LOG_DEBUG, f"Audio cue file not found: {audio_file}")
+    if not _AUDIO_FILE_OK:
+        obs.script_log(obs.LOG_DEBUG, f"Audio cue file not found: {_AUDIO_FILE}")
         return
 
     try:
-        _run_host_command(["paplay", str(audio_file)])
+        _spawn_host_command(["paplay", _AUDIO_FILE])
     except Exception as e:
         obs.script_log(obs.LOG_DEBUG, f"Could not play audio cue: {e}")
 
 
-def get_active_window_name() -> str:
-    """Get the name of the active window using xdotool."""
+def _get_window_name_and_pid() -> tuple:
+    """Get the name and PID of the active window.
+
+    Queries X directly when python-xlib is installed (and we're not in a
+    Flatpak sandbox), otherwise runs xdotool.
+    """
+    name, pid = "", ""
+    if xdisplay is not None and not _IS_FLATPAK:
+        try:
+            name, pid = _query_active_window_xlib()
+        except Exception as e:
+            obs.script_log(obs.LOG_DEBUG, f"Xlib query failed, using xdotool: {e}")
+            _close_x_display()
+            name, pid = _query_active_window_xdotool()
+    else:
+        name, pid = _query_active_window_xdotool()
+
+    # Remove zero-width and invisible unicode characters
+    return _INVIS_RE.sub('', name), pid
+
+
+def _query_active_window_xdotool() -> tuple:
+    """Get the active window's name and PID with a single xdotool call."""
     try:
-        result = _run_host_command(["xdotool", "getactivewindow", "getwindowname"])
-        if result.returncode == 0:
-            name = result.stdout.strip()
-            # Remove zero-width and invisible unicode characters
-            name = re.sub(r'[\u200b-\u200f\u2028-\u202f\u2060-\u206f\ufeff]', '', name)
-            return name
+        result = _run_host_command(
+            ["xdotool", "getactivewindow", "getwindowname", "getwindowpid"]
+        )
     except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
-    return ""
+        return "", ""
+
+    # xdotool prints one line per chained command; getwindowpid fails (and
+    # prints nothing) for windows without _NET_WM_PID, but the name still comes through
+    lines = result.stdout.rstrip("\n").split("\n")
+    pid = lines.pop() if len(lines) > 1 and lines[-1].strip().isdigit() else ""
+    name = "\n".join(lines).strip()
+    return name, pid.strip()
+
+
+def _query_active_window_xlib() -> tuple:
+    """Get the active window's name and PID over a persistent X connection."""
+    global _x_display
+    if _x_display is None:
+        _x_display = xdisplay.Display(_HOST_ENV["DISPLAY"])
+    disp = _x_display
+
+    root = disp.screen().root
+    active = root.get_full_property(disp.intern_atom("_NET_ACTIVE_WINDOW"), X.AnyPropertyType)
+    if not active or not active.value or not active.value[0]:
+        return "", ""
+    window = disp.create_resource_object("window", active.value[0])
+
+    name_prop = window.get_full_property(
+        disp.intern_atom("_NET_WM_NAME"), disp.intern_atom("UTF8_STRING")
+    )
+    name = name_prop.value if name_prop else window.get_wm_name()
+    if isinstance(name, bytes):
+        name = name.decode("utf-8", "replace")
+
+    pid_prop = window.get_full_property(disp.intern_atom("_NET_WM_PID"), X.AnyPropertyType)
+    pid = str(pid_prop.value[0]) if pid_prop and pid_prop.value else ""
+    return (name or "").strip(), pid
+
 
+def _close_x_display() -> None:
+    """Drop the cached X connection; the next query reconnects."""
+    global _x_display
+    if _x_display is not None:
+        try:
+            _x_display.close()
+        except Exception:
+            pass
+        _x_display = None
 
-def get_active_window_class() -> str:
-    """Get the process name of the active window using xdotool."""
+
+def _read_comm(pid: str) -> str:
+    """Get the process name for a PID from /proc."""
+    # Accessible even in Flatpak with --filesystem=host
     try:
-        result = _run_host_command(["xdotool", "getactivewindow", "getwindowpid"])
-        if result.returncode == 0:
-            pid = result.stdout.strip()
-            # Get process name from /proc (accessible even in Flatpak with --filesystem=host)
-            try:
-                with open(f"/proc/{pid}/comm") as f:
-                    return f.read().strip()
-            except (FileNotFoundError, PermissionError):
-                pass
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
-    return ""
+        with open(_PROC_COMM_PATH.format(pid=pid)) as f:
+            return f.read().strip()
+    except (FileNotFoundError, PermissionError):
+        return ""
+
+
+def _match_game_pattern(text: str) -> str:
+    """Return the mapped game name for the highest-priority pattern in text."""
+    matches = [m.group(1) for m in _GAME_PATTERN_RE.finditer(text)]
+    if not matches:
+        return ""
+    return GAME_NAME_MAP[min(matches, key=_GAME_PATTERN_PRIORITY.__getitem__)]
 
 
 def detect_game_name() -> str:
     """Detect the active game from window name or class."""
-    window_name = get_active_window_name()
-    window_class = get_active_window_class()
+    window_name, pid = _get_window_name_and_pid()
+    window_class = _read_comm(pid) if pid else ""
 
     obs.script_log(obs.LOG_DEBUG, f"Active window: '{window_name}' ({window_class})")
 
-    # Check window class first (more reliable)
-    class_lower = window_class.lower()
-    for pattern, game_name in GAME_NAME_MAP.items():
-        if pattern in class_lower:
-            return game_name
+    return _resolve_game_name(window_name, window_class)
+
+
+@functools.lru_cache(maxsize=128)
+def _resolve_game_name(window_name: str, window_class: str) -> str:
+    """Map a window name and process name to a game name."""
 
-    # Check window name
     name_lower = window_name.lower()
-    for pattern, game_name in GAME_NAME_MAP.items():
-        if pattern in name_lower:
+
+    # Check window class first (more reliable), then window name
+    for text in (window_class.lower(), name_lower):
+        game_name = _match_game_pattern(text)
+        if game_name:
             return game_name
 
     # If window name looks like a game title, use it directly
-    if window_name and not any(x in window_name.lower() for x in ["obs", "chrome", "firefox", "terminal", "code"]):
+    if window_name and _NOT_A_GAME_RE.search(name_lower) is None:
         # Clean up window name (remove version numbers, etc.)
-        clean_name = re.sub(r"\s*[-–]\s*.*$", "", window_name)  # Remove " - subtitle" parts
-        clean_name = re.sub(r"\s*\(.*?\)\s*", " ", clean_name)  # Remove (stuff in parens)
-        clean_name = re.sub(r"\s*v?\d+\.\d+.*$", "", clean_name)  # Remove version numbers
+        clean_name = _SUBTITLE_RE.sub("", window_name)  # Remove " - subtitle" parts
+        clean_name = _PARENS_RE.sub(" ", clean_name)  # Remove (stuff in parens)
+        clean_name = _VERSION_RE.sub("", clean_name)  # Remove version numbers
         clean_name = clean_name.strip()
         if clean_name and len(clean_name) < 50:
             return clean_name
@@ -203,6 +348,15 @@ def detect_game_name() -> str:
     return "Clip"
 
 
+def get_last_replay_path() -> str:
+    """Get the path of the replay OBS just saved, or "" if OBS can't say."""
+    # obs_frontend_get_last_replay is missing from older OBS versions
+    get_last_replay = getattr(obs, "obs_frontend_get_last_replay", None)
+    if get_last_replay is None:
+        return ""
+    return get_last_replay() or ""
+
+
 def get_replay_path() -> str:
     """Get the path of the last saved replay from OBS output settings."""
     output = obs.obs_frontend_get_replay_buffer_output()
@@ -217,37 +371,115 @@ def get_replay_path() -> str:
 
 def find_latest_replay(directory: str) -> str:
     """Find the most recently created replay file in the directory."""
-    replay_dir = Path(directory)
-    if not replay_dir.exists():
-        return ""
+    latest = ""
+    latest_mtime = -1.0
 
-    # Find most recent .mp4 or .mkv file
-    video_files = list(replay_dir.glob("*.mp4")) + list(replay_dir.glob("*.mkv"))
-    if not video_files:
+    # Find most recent .mp4 or .mkv file in a single directory pass
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith((".mp4", ".mkv")):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue  # Removed since the directory was listed
+                if mtime > latest_mtime:
+                    latest, latest_mtime = entry.path, mtime
+    except (FileNotFoundError, NotADirectoryError):
         return ""
 
-    latest = max(video_files, key=lambda p: p.stat().st_mtime)
-    return str(latest)
+    return latest
 
 
-def handle_replay_saved():
-    """Handle replay buffer save event."""
-    global upload_script_path, python_executable
+def _rename_no_replace(src: Path, dst: Path) -> bool:
+    """Rename src to dst unless dst already exists. Returns True if renamed.
 
-    play_audio_cue()
+    Uses link + unlink so the existence check and the rename are a single
+    atomic step; an earlier clip with the same name is never overwritten.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return False
+    except OSError:
+        # Filesystem without hard link support (e.g. exFAT); use a checked rename
+        if os.path.lexists(dst):
+            return False
+        os.rename(src, dst)
+        return True
+    os.unlink(src)
+    return True
+
+
+def _ensure_upload_daemon() -> subprocess.Popen:
+    """Return a running upload daemon, starting one if needed.
+
+    Must be called with _daemon_lock held.
+    """
+    global _daemon_proc, _daemon_argv
+
+    argv = [python_executable, upload_script_path, "--daemon"]
+    if _daemon_proc is not None and _daemon_proc.poll() is None:
+        if argv == _daemon_argv:
+            return _daemon_proc
+        # Paths changed in the script settings; let the old daemon drain
+        _close_daemon_stdin(_daemon_proc)
+
+    # Detached so uploads in progress survive OBS exiting
+    _daemon_proc = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        text=True,
+    )
+    _daemon_argv = argv
+    obs.script_log(obs.LOG_DEBUG, f"Started upload daemon (pid {_daemon_proc.pid})")
+    return _daemon_proc
 
-    if not upload_script_path:
-        obs.script_log(obs.LOG_WARNING, "Upload script path not configured. Go to Tools > Scripts to set paths.")
-        return
 
-    if not python_executable:
-        obs.script_log(obs.LOG_WARNING, "Python executable not configured. Go to Tools > Scripts to set paths.")
-        return
+def _close_daemon_stdin(proc: subprocess.Popen) -> None:
+    """Signal EOF to a daemon; it exits after finishing queued uploads."""
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
 
-    if not os.path.exists(upload_script_path):
-        obs.script_log(obs.LOG_WARNING, f"Upload script not found: {upload_script_path}")
-        return
 
+def _send_upload_job(file_path: str, title: str) -> None:
+    """Queue a clip upload on the daemon, restarting it once if it has died."""
+    global _daemon_proc
+
+    job = json.dumps({"file": file_path, "title": title}) + "\n"
+    with _daemon_lock:
+        for attempt in range(2):
+            proc = _ensure_upload_daemon()
+            try:
+                proc.stdin.write(job)
+                proc.stdin.flush()
+                return
+            except (BrokenPipeError, ValueError):
+                # Daemon exited between the liveness check and the write
+                _close_daemon_stdin(proc)
+                _daemon_proc = None
+                if attempt:
+                    raise
+
+
+def _stop_upload_daemon() -> None:
+    """Close the upload daemon's job queue."""
+    global _daemon_proc, _daemon_argv
+    with _daemon_lock:
+        if _daemon_proc is not None:
+            _close_daemon_stdin(_daemon_proc)
+        _daemon_proc = None
+        _daemon_argv = None
+
+
+def _find_replay_in_output_dir() -> str:
+    """Find the newest replay in the replay buffer's output directory."""
     # Get replay directory from OBS settings
     replay_path = get_replay_path()
     if not replay_path:
@@ -260,46 +492,71 @@ def handle_replay_saved():
 
     if not replay_path:
         obs.script_log(obs.LOG_WARNING, "Could not determine replay directory")
-        return
+        return ""
 
     # Find the most recent replay file
     original_file = find_latest_replay(replay_path)
     if not original_file:
         obs.script_log(obs.LOG_WARNING, f"No replay file found in {replay_path}")
+    return original_file
+
+
+def handle_replay_saved(replay_file: str = ""):
+    """Handle replay buffer save event.
+
+    replay_file is the path OBS reported for the saved replay; when empty,
+    the newest file in the replay output directory is used instead.
+    """
+    global upload_script_path, python_executable
+
+    play_audio_cue()
+
+    if not upload_script_path:
+        obs.script_log(obs.LOG_WARNING, "Upload script path not configured. Go to Tools > Scripts to set paths.")
         return
 
+    if not python_executable:
+        obs.script_log(obs.LOG_WARNING, "Python executable not configured. Go to Tools > Scripts to set paths.")
+        return
+
+    if not os.path.exists(upload_script_path):
+        obs.script_log(obs.LOG_WARNING, f"Upload script not found: {upload_script_path}")
+        return
+
+    # Use the exact file OBS reported; scan the replay directory only when
+    # it didn't report one (older OBS versions)
+    if replay_file and os.path.isfile(replay_file):
+        original_file = replay_file
+    else:
+        original_file = _find_replay_in_output_dir()
+        if not original_file:
+            return
+
     obs.script_log(obs.LOG_INFO, f"Replay saved: {original_file}")
 
     # Detect game and format timestamp
     game_name = detect_game_name()
-    timestamp = datetime.now()
-    formatted_time = timestamp.strftime("%Y-%m-%d %H-%M")
-    title = f"{game_name} - {timestamp.strftime('%Y-%m-%d %H:%M')}"
+    display_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+    formatted_time = display_time.replace(":", "-")  # Filename-safe
+    title = f"{game_name} - {display_time}"
 
     # Rename file
     original_path = Path(original_file)
     new_filename = f"{game_name} - {formatted_time}{original_path.suffix}"
     new_path = original_path.parent / new_filename
 
+    file_to_upload = original_file
+    if original_path != new_path:
+        try:
+            if _rename_no_replace(original_path, new_path):
+                obs.script_log(obs.LOG_INFO, f"Renamed to: {new_filename}")
+                file_to_upload = str(new_path)
+        except OSError as e:
+            obs.script_log(obs.LOG_WARNING, f"Could not rename file: {e}")
+
+    # Hand the clip to the upload daemon
     try:
-        if original_path != new_path and not new_path.exists():
-            original_path.rename(new_path)
-            obs.script_log(obs.LOG_INFO, f"Renamed to: {new_filename}")
-            file_to_upload = str(new_path)
-        else:
-            file_to_upload = original_file
-    except OSError as e:
-        obs.script_log(obs.LOG_WARNING, f"Could not rename file: {e}")
-        file_to_upload = original_file
-
-    # Spawn upload subprocess (detached)
-    try:
-        subprocess.Popen(
-            [python_executable, upload_script_path, "--file", file_to_upload, "--title", title],
-            start_new_session=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        _send_upload_job(file_to_upload, title)
         obs.script_log(obs.LOG_INFO, f"Upload started: {title}")
     except Exception as e:
         obs.script_log(obs.LOG_ERROR, f"Failed to start upload: {e}")
@@ -1,10 +1,40 @@
 """Shared fixtures for tests."""
 
+import sys
+import types
+
 import pytest
 from pathlib import Path
 from unittest.mock import MagicMock
 
 
+def pytest_configure(config):
+    """Install a stand-in obspython module before any test imports obs_clip_hook.
+
+    obspython only exists inside OBS. Constants are plain attributes; only
+    the functions the tests inspect are mocks.
+    """
+    sys.modules["obspython"] = types.SimpleNamespace(
+        LOG_INFO=0,
+        LOG_WARNING=1,
+        LOG_ERROR=2,
+        LOG_DEBUG=3,
+        OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED=100,
+        OBS_PATH_FILE=1,
+        OBS_TEXT_DEFAULT=0,
+        script_log=MagicMock(),
+        obs_frontend_get_last_replay=MagicMock(return_value=""),
+    )
+
+
+@pytest.fixture(autouse=True)
+def _no_sleep(monkeypatch):
+    """Never really sleep in tests; returns the list of requested delays."""
+    sleeps = []
+    monkeypatch.setattr("upload_clip.time.sleep", sleeps.append)
+    return sleeps
+
+
 @pytest.fixture
 def temp_config_dir(tmp_path):
     """Create a temporary config directory structure."""
@@ -50,8 +80,9 @@ def mock_youtube_service():
     mock_service.videos.return_value = mock_videos
     mock_videos.insert.return_value = mock_insert
 
-    # Mock the upload response
+    # Mock the upload response, for both resumable and single-request uploads
     mock_insert.next_chunk.return_value = (None, {"id": "test_video_id_123"})
+    mock_insert.execute.return_value = {"id": "test_video_id_123"}
 
     return mock_service
 
@@ -62,3 +93,11 @@ def temp_video_file(tmp_path):
     video_file = tmp_path / "test_video.mp4"
     video_file.write_bytes(b"fake video content")
     return video_file
+
+
+@pytest.fixture(scope="session")
+def auth_setup_mod():
+    """Import auth_setup (and its Google auth dependencies) once per session."""
+    import auth_setup
+
+    return auth_setup
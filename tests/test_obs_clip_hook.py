@@ -1,202 +1,316 @@
 """Tests for obs_clip_hook.py.
 
-Since obspython is only available inside OBS, we mock it for testing.
+Since obspython is only available inside OBS, conftest.py installs a
+stand-in module for testing.
 """
 
+import json
+import os
 import sys
+import threading
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 from datetime import datetime
 
 import pytest
 
-# Create a mock obspython module before importing obs_clip_hook
-mock_obs = MagicMock()
-mock_obs.LOG_INFO = 0
-mock_obs.LOG_WARNING = 1
-mock_obs.LOG_ERROR = 2
-mock_obs.LOG_DEBUG = 3
-mock_obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED = 100
-mock_obs.OBS_PATH_FILE = 1
-mock_obs.OBS_TEXT_DEFAULT = 0
-sys.modules["obspython"] = mock_obs
-
-# Now we can import from obs_clip_hook
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
 from obs_clip_hook import (
     GAME_NAME_MAP,
-    get_active_window_name,
-    get_active_window_class,
+    _get_window_name_and_pid,
+    _read_comm,
+    _rename_no_replace,
+    _send_upload_job,
+    _spawn_host_command,
+    _stop_upload_daemon,
     detect_game_name,
     find_latest_replay,
+    get_last_replay_path,
+    handle_replay_saved,
+    on_frontend_event,
     play_audio_cue,
 )
+import obs_clip_hook
+
+mock_obs = sys.modules["obspython"]
+
+
+@pytest.fixture(autouse=True)
+def reset_script_log():
+    """Start every test with no recorded script_log calls."""
+    mock_obs.script_log.reset_mock()
+
+
+@pytest.fixture(autouse=True)
+def clear_detection_caches():
+    """Start every test with an empty game-name cache."""
+    obs_clip_hook._resolve_game_name.cache_clear()
+    yield
+    obs_clip_hook._resolve_game_name.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_upload_daemon():
+    """Don't let a (mock) upload daemon leak between tests."""
+    obs_clip_hook._daemon_proc = None
+    obs_clip_hook._daemon_argv = None
+    yield
+    obs_clip_hook._daemon_proc = None
+    obs_clip_hook._daemon_argv = None
+
+
+@pytest.fixture(scope="module")
+def game_map():
+    """The hook's GAME_NAME_MAP, bound once for the module."""
+    return GAME_NAME_MAP
 
 
 class TestGameNameMap:
     """Tests for GAME_NAME_MAP configuration."""
 
-    def test_game_name_map_contains_common_games(self):
+    def test_game_name_map_contains_common_games(self, game_map):
         """Should have mappings for common games."""
-        assert "valorant" in GAME_NAME_MAP
-        assert "minecraft" in GAME_NAME_MAP
-        assert "csgo" in GAME_NAME_MAP
+        assert "valorant" in game_map
+        assert "minecraft" in game_map
+        assert "csgo" in game_map
 
-    def test_game_name_map_values_are_formatted(self):
+    def test_game_name_map_values_are_formatted(self, game_map):
         """Game names should be properly formatted."""
-        assert GAME_NAME_MAP["valorant"] == "Valorant"
-        assert GAME_NAME_MAP["league of legends"] == "League of Legends"
-        assert GAME_NAME_MAP["csgo"] == "CS:GO"
+        assert game_map["valorant"] == "Valorant"
+        assert game_map["league of legends"] == "League of Legends"
+        assert game_map["csgo"] == "CS:GO"
 
 
-class TestGetActiveWindowName:
-    """Tests for get_active_window_name function."""
+class TestGetWindowNameAndPid:
+    """Tests for _get_window_name_and_pid function."""
 
-    @patch("obs_clip_hook.subprocess.run")
-    def test_get_active_window_name_returns_window_title(self, mock_run):
-        """Should return the active window name from xdotool."""
-        mock_run.return_value = MagicMock(returncode=0, stdout="Valorant\n")
+    @pytest.fixture(autouse=True)
+    def without_xlib(self, monkeypatch):
+        """Exercise the xdotool path regardless of whether python-xlib is installed."""
+        monkeypatch.setattr(obs_clip_hook, "xdisplay", None)
 
-        result = get_active_window_name()
+    @staticmethod
+    def fake_run(monkeypatch, returncode=0, stdout="", raises=None):
+        """Replace subprocess.run with a stub; returns the list of argv it was called with."""
+        calls = []
 
-        assert result == "Valorant"
-        mock_run.assert_called_once()
-        args = mock_run.call_args[0][0]
+        def run(cmd, *args, **kwargs):
+            calls.append(cmd)
+            if raises is not None:
+                raise raises
+            return SimpleNamespace(returncode=returncode, stdout=stdout)
+
+        monkeypatch.setattr(obs_clip_hook.subprocess, "run", run)
+        return calls
+
+    def test_get_window_name_and_pid_uses_single_xdotool_call(self, monkeypatch):
+        """Should return window name and PID from one chained xdotool call."""
+        calls = self.fake_run(monkeypatch, stdout="Valorant\n12345\n")
+
+        result = _get_window_name_and_pid()
+
+        assert result == ("Valorant", "12345")
+        assert len(calls) == 1
+        args = calls[0]
         assert "xdotool" in args
         assert "getwindowname" in args
+        assert "getwindowpid" in args
 
-    @patch("obs_clip_hook.subprocess.run")
-    def test_get_active_window_name_returns_empty_on_failure(self, mock_run):
-        """Should return empty string when xdotool fails."""
-        mock_run.return_value = MagicMock(returncode=1, stdout="")
+    def test_get_window_name_and_pid_keeps_name_without_pid(self, monkeypatch):
+        """Should return the window name when the window has no PID."""
+        self.fake_run(monkeypatch, returncode=1, stdout="Valorant\n")
 
-        result = get_active_window_name()
+        result = _get_window_name_and_pid()
 
-        assert result == ""
+        assert result == ("Valorant", "")
 
-    @patch("obs_clip_hook.subprocess.run", side_effect=FileNotFoundError)
-    def test_get_active_window_name_handles_missing_xdotool(self, mock_run):
-        """Should return empty string when xdotool is not installed."""
-        result = get_active_window_name()
+    def test_get_window_name_and_pid_strips_invisible_characters(self, monkeypatch):
+        """Should remove zero-width characters from the window name."""
+        self.fake_run(monkeypatch, stdout="Arc\u200b Raiders\n42\n")
 
-        assert result == ""
+        result = _get_window_name_and_pid()
 
-    @patch("obs_clip_hook.subprocess.run")
-    def test_get_active_window_name_handles_timeout(self, mock_run):
-        """Should return empty string on timeout."""
-        from subprocess import TimeoutExpired
+        assert result == ("Arc Raiders", "42")
 
-        mock_run.side_effect = TimeoutExpired("xdotool", 2)
+    def test_get_window_name_and_pid_returns_empty_on_failure(self, monkeypatch):
+        """Should return empty strings when xdotool fails."""
+        self.fake_run(monkeypatch, returncode=1, stdout="")
 
-        result = get_active_window_name()
+        result = _get_window_name_and_pid()
 
-        assert result == ""
+        assert result == ("", "")
 
+    def test_get_window_name_and_pid_handles_missing_xdotool(self, monkeypatch):
+        """Should return empty strings when xdotool is not installed."""
+        self.fake_run(monkeypatch, raises=FileNotFoundError())
 
-class TestGetActiveWindowClass:
-    """Tests for get_active_window_class function."""
+        result = _get_window_name_and_pid()
 
-    @patch("builtins.open", create=True)
-    @patch("obs_clip_hook.subprocess.run")
-    def test_get_active_window_class_returns_class_name(self, mock_run, mock_open):
-        """Should return process name via PID from xdotool."""
-        mock_run.return_value = MagicMock(returncode=0, stdout="12345\n")
-        mock_file = MagicMock()
-        mock_file.read.return_value = "VALORANT.exe\n"
-        mock_file.__enter__ = MagicMock(return_value=mock_file)
-        mock_file.__exit__ = MagicMock(return_value=False)
-        mock_open.return_value = mock_file
+        assert result == ("", "")
 
-        result = get_active_window_class()
+    def test_get_window_name_and_pid_handles_timeout(self, monkeypatch):
+        """Should return empty strings on timeout."""
+        from subprocess import TimeoutExpired
 
-        assert result == "VALORANT.exe"
-        args = mock_run.call_args[0][0]
-        assert "getwindowpid" in args
+        self.fake_run(monkeypatch, raises=TimeoutExpired("xdotool", 2))
 
+        result = _get_window_name_and_pid()
 
-class TestDetectGameName:
-    """Tests for detect_game_name function."""
+        assert result == ("", "")
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_matches_from_class(self, mock_name, mock_class):
-        """Should detect game from window class."""
-        mock_name.return_value = "Some Window"
-        mock_class.return_value = "valorant.exe"
 
-        result = detect_game_name()
+class TestQueryActiveWindowXlib:
+    """Tests for the python-xlib active window query."""
 
-        assert result == "Valorant"
+    @pytest.fixture
+    def fake_x(self):
+        """Install a fake X display whose active window is a game."""
+        disp = MagicMock()
+        disp.intern_atom.side_effect = lambda name: name
+        window = disp.create_resource_object.return_value
+        properties = {
+            "_NET_WM_NAME": SimpleNamespace(value="Elden Ring\u200b".encode()),
+            "_NET_WM_PID": SimpleNamespace(value=[4242]),
+        }
+        window.get_full_property.side_effect = lambda atom, _type: properties.get(atom)
+        disp.screen.return_value.root.get_full_property.return_value = SimpleNamespace(value=[0x1234])
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_matches_from_window_name(self, mock_name, mock_class):
-        """Should detect game from window name when class doesn't match."""
-        mock_name.return_value = "Minecraft 1.20"
-        mock_class.return_value = "java"
+        xdisplay = MagicMock()
+        xdisplay.Display.return_value = disp
+        with patch("obs_clip_hook.xdisplay", xdisplay), \
+                patch("obs_clip_hook.X", SimpleNamespace(AnyPropertyType=0)), \
+                patch("obs_clip_hook._IS_FLATPAK", False):
+            obs_clip_hook._x_display = None
+            yield xdisplay, disp, properties
+            obs_clip_hook._x_display = None
 
-        result = detect_game_name()
+    @patch("obs_clip_hook.subprocess.run")
+    def test_xlib_query_returns_name_and_pid(self, mock_run, fake_x):
+        """Should read the active window over X without running xdotool."""
+        result = _get_window_name_and_pid()
 
-        assert result == "Minecraft"
+        assert result == ("Elden Ring", "4242")
+        mock_run.assert_not_called()
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_uses_window_title_as_fallback(self, mock_name, mock_class):
-        """Should use cleaned window title when no match in map."""
-        mock_name.return_value = "Awesome Game 2024 - Main Menu"
-        mock_class.return_value = "unknown"
+    def test_xlib_query_reuses_display(self, fake_x):
+        """Should open the X connection once and reuse it."""
+        xdisplay, _, _ = fake_x
 
-        result = detect_game_name()
+        _get_window_name_and_pid()
+        _get_window_name_and_pid()
 
-        assert result == "Awesome Game 2024"
+        xdisplay.Display.assert_called_once()
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_filters_common_apps(self, mock_name, mock_class):
-        """Should not use common app names as game names."""
-        mock_name.return_value = "OBS Studio"
-        mock_class.return_value = "obs"
+    def test_xlib_query_handles_window_without_pid(self, fake_x):
+        """Should return an empty PID when the window has no _NET_WM_PID."""
+        _, _, properties = fake_x
+        del properties["_NET_WM_PID"]
 
-        result = detect_game_name()
+        assert _get_window_name_and_pid() == ("Elden Ring", "")
 
-        assert result == "Clip"  # Default fallback
+    @patch("obs_clip_hook.subprocess.run")
+    def test_xlib_failure_falls_back_to_xdotool(self, mock_run, fake_x):
+        """Should fall back to xdotool and reconnect next time when X fails."""
+        xdisplay, _, _ = fake_x
+        xdisplay.Display.side_effect = Exception("cannot connect")
+        mock_run.return_value = SimpleNamespace(returncode=0, stdout="Valorant\n12345\n")
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_returns_clip_when_no_window(self, mock_name, mock_class):
-        """Should return 'Clip' when no window is detected."""
-        mock_name.return_value = ""
-        mock_class.return_value = ""
+        result = _get_window_name_and_pid()
 
-        result = detect_game_name()
+        assert result == ("Valorant", "12345")
+        assert obs_clip_hook._x_display is None
 
-        assert result == "Clip"
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_cleans_version_numbers(self, mock_name, mock_class):
-        """Should remove version numbers from window titles."""
-        mock_name.return_value = "Cool Game v1.2.3"
-        mock_class.return_value = "unknown"
+class TestReadComm:
+    """Tests for _read_comm function."""
 
-        result = detect_game_name()
+    def test_read_comm_returns_process_name(self, tmp_path, monkeypatch):
+        """Should return process name from /proc/<pid>/comm."""
+        (tmp_path / "12345_comm").write_text("VALORANT.exe\n")
+        monkeypatch.setattr(obs_clip_hook, "_PROC_COMM_PATH", str(tmp_path / "{pid}_comm"))
 
-        assert "v1.2.3" not in result
-        assert result == "Cool Game"
+        result = _read_comm("12345")
 
-    @patch("obs_clip_hook.get_active_window_class")
-    @patch("obs_clip_hook.get_active_window_name")
-    def test_detect_game_name_removes_parenthetical_content(self, mock_name, mock_class):
-        """Should remove content in parentheses."""
-        mock_name.return_value = "Game Title (Early Access)"
-        mock_class.return_value = "unknown"
+        assert result == "VALORANT.exe"
+
+    def test_read_comm_returns_empty_for_missing_process(self):
+        """Should return empty string when the process does not exist."""
+        result = _read_comm("999999999")
+
+        assert result == ""
 
-        result = detect_game_name()
+    def test_read_comm_reads_current_process_for_reused_pid(self, tmp_path, monkeypatch):
+        """Should not return a previous process's name once its PID is reused."""
+        comm = tmp_path / "12345_comm"
+        monkeypatch.setattr(obs_clip_hook, "_PROC_COMM_PATH", str(tmp_path / "{pid}_comm"))
 
-        assert "(Early Access)" not in result
+        comm.write_text("VALORANT.exe\n")
+        assert _read_comm("12345") == "VALORANT.exe"
+        comm.write_text("java\n")
+        assert _read_comm("12345") == "java"
 
 
+class TestDetectGameName:
+    """Tests for detect_game_name function."""
+
+    @pytest.mark.parametrize(
+        "name,cls,expected",
+        [
+            pytest.param("Some Window", "valorant.exe", "Valorant", id="matches-from-class"),
+            pytest.param("Minecraft 1.20", "java", "Minecraft", id="matches-from-window-name"),
+            pytest.param("Lutris - Arc Raiders", "unknown", "Arc Raiders", id="prefers-longest-pattern"),
+            pytest.param("Minecraft Launcher", "r5apex.exe", "Apex Legends", id="class-wins-over-name"),
+            pytest.param(
+                "Awesome Game 2024 - Main Menu", "unknown", "Awesome Game 2024",
+                id="window-title-fallback",
+            ),
+            pytest.param("OBS Studio", "obs", "Clip", id="filters-common-apps"),
+            pytest.param("", "", "Clip", id="no-window"),
+            pytest.param("Cool Game v1.2.3", "unknown", "Cool Game", id="cleans-version-numbers"),
+            pytest.param("Game Title (Early Access)", "unknown", "Game Title", id="removes-parentheticals"),
+        ],
+    )
+    def test_detect_game_name(self, monkeypatch, name, cls, expected):
+        """Should map the active window to a game name, or fall back to 'Clip'."""
+        monkeypatch.setattr(obs_clip_hook, "_get_window_name_and_pid", lambda: (name, "4242"))
+        monkeypatch.setattr(obs_clip_hook, "_read_comm", lambda pid: cls)
+
+        assert detect_game_name() == expected
+
+    def test_detect_game_name_caches_repeat_window(self, monkeypatch):
+        """Should reuse the resolved name for a window it has already seen."""
+        monkeypatch.setattr(obs_clip_hook, "_get_window_name_and_pid", lambda: ("Some Window", "4242"))
+        monkeypatch.setattr(obs_clip_hook, "_read_comm", lambda pid: "valorant.exe")
+
+        assert detect_game_name() == "Valorant"
+        assert detect_game_name() == "Valorant"
+
+        info = obs_clip_hook._resolve_game_name.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+
+    def test_script_unload_clears_detection_caches(self):
+        """Should drop cached game names when the script unloads."""
+        obs_clip_hook._resolve_game_name("Some Window", "valorant.exe")
+        obs_clip_hook.script_unload()
+
+        assert obs_clip_hook._resolve_game_name.cache_info().currsize == 0
+
+
+@pytest.fixture(scope="module")
+def replay_dirs(tmp_path_factory):
+    """Create the read-only replay directory scenarios once per module."""
+    root = tmp_path_factory.mktemp("replays")
+    dirs = {name: root / name for name in ("empty", "mp4", "mkv", "other")}
+    for path in dirs.values():
+        path.mkdir()
+    (dirs["mp4"] / "test.mp4").write_bytes(b"video")
+    (dirs["mkv"] / "test.mkv").write_bytes(b"video")
+    (dirs["other"] / "notes.txt").write_text("not a video")
+    (dirs["other"] / "clip.mp4.part").write_bytes(b"partial")
+    return dirs
+
+
+@pytest.mark.slow
 class TestFindLatestReplay:
     """Tests for find_latest_replay function."""
 
@@ -206,86 +320,140 @@ class TestFindLatestReplay:
 
         assert result == ""
 
-    def test_find_latest_replay_returns_empty_for_empty_dir(self, tmp_path):
+    def test_find_latest_replay_returns_empty_for_empty_dir(self, replay_dirs):
         """Should return empty string when no video files exist."""
-        result = find_latest_replay(str(tmp_path))
+        assert find_latest_replay(str(replay_dirs["empty"])) == ""
 
-        assert result == ""
-
-    def test_find_latest_replay_finds_mp4_files(self, tmp_path):
+    def test_find_latest_replay_finds_mp4_files(self, replay_dirs):
         """Should find .mp4 files."""
-        video_file = tmp_path / "test.mp4"
-        video_file.write_bytes(b"video")
-
-        result = find_latest_replay(str(tmp_path))
-
-        assert result == str(video_file)
+        assert find_latest_replay(str(replay_dirs["mp4"])) == str(replay_dirs["mp4"] / "test.mp4")
 
-    def test_find_latest_replay_finds_mkv_files(self, tmp_path):
+    def test_find_latest_replay_finds_mkv_files(self, replay_dirs):
         """Should find .mkv files."""
-        video_file = tmp_path / "test.mkv"
-        video_file.write_bytes(b"video")
+        assert find_latest_replay(str(replay_dirs["mkv"])) == str(replay_dirs["mkv"] / "test.mkv")
 
-        result = find_latest_replay(str(tmp_path))
-
-        assert result == str(video_file)
+    def test_find_latest_replay_ignores_other_files(self, replay_dirs):
+        """Should skip files that aren't .mp4 or .mkv."""
+        assert find_latest_replay(str(replay_dirs["other"])) == ""
 
     def test_find_latest_replay_returns_most_recent(self, tmp_path):
         """Should return the most recently modified file."""
-        import time
-
         old_file = tmp_path / "old.mp4"
         old_file.write_bytes(b"old")
-
-        time.sleep(0.1)  # Ensure different mtime
+        os.utime(old_file, (1_700_000_000, 1_700_000_000))
 
         new_file = tmp_path / "new.mp4"
         new_file.write_bytes(b"new")
+        os.utime(new_file, (1_700_000_001, 1_700_000_001))
 
         result = find_latest_replay(str(tmp_path))
 
         assert result == str(new_file)
 
 
+class TestOnFrontendEvent:
+    """Tests for on_frontend_event function."""
+
+    @patch("obs_clip_hook.handle_replay_saved")
+    def test_on_frontend_event_handles_replay_on_background_thread(self, mock_handle):
+        """Should run replay handling off the calling thread."""
+        handled = threading.Event()
+        caller = threading.current_thread()
+        calls = []
+
+        def record_thread(replay_file):
+            calls.append((threading.current_thread(), replay_file))
+            handled.set()
+
+        mock_handle.side_effect = record_thread
+
+        with patch.object(mock_obs, "obs_frontend_get_last_replay", return_value="/clips/Replay.mp4"):
+            on_frontend_event(mock_obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED)
+
+        assert handled.wait(timeout=5)
+        thread, replay_file = calls[0]
+        assert thread is not caller
+        assert replay_file == "/clips/Replay.mp4"
+
+    @patch("obs_clip_hook.threading.Thread")
+    def test_on_frontend_event_ignores_other_events(self, mock_thread):
+        """Should not start a thread for unrelated frontend events."""
+        on_frontend_event(mock_obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED + 1)
+
+        mock_thread.assert_not_called()
+
+
+class TestGetLastReplayPath:
+    """Tests for get_last_replay_path function."""
+
+    def test_get_last_replay_path_returns_obs_path(self):
+        """Should return the path OBS reports for the last replay."""
+        with patch.object(mock_obs, "obs_frontend_get_last_replay", return_value="/clips/Replay.mp4"):
+            assert get_last_replay_path() == "/clips/Replay.mp4"
+
+    def test_get_last_replay_path_handles_older_obs(self):
+        """Should return empty string when OBS lacks obs_frontend_get_last_replay."""
+        with patch("obs_clip_hook.obs", spec=[]):
+            assert get_last_replay_path() == ""
+
+
+REPLAY_NAME = "Replay_2026-01-21_14-30-00.mp4"
+
+
+@pytest.fixture(scope="class")
+def replay_template(tmp_path_factory):
+    """Build the OBS replay file once per test class."""
+    template = tmp_path_factory.mktemp("replay_template")
+    (template / REPLAY_NAME).write_bytes(b"video")
+    return template
+
+
+@pytest.fixture
+def replay_dir(tmp_path, replay_template):
+    """Give each test its own replay directory, hard-linked from the template."""
+    for f in replay_template.iterdir():
+        os.link(f, tmp_path / f.name)
+    return tmp_path
+
+
+@pytest.mark.slow
 class TestHandleReplaySaved:
     """Tests for handle_replay_saved function."""
 
+    @pytest.fixture(autouse=True)
+    def configure_paths(self, monkeypatch):
+        """Point the hook at a fake upload script that only os.path.exists sees."""
+        monkeypatch.setattr(obs_clip_hook, "upload_script_path", "/path/to/upload_clip.py")
+        monkeypatch.setattr(obs_clip_hook, "python_executable", "python3")
+        real_exists = os.path.exists
+        monkeypatch.setattr(
+            "os.path.exists", lambda p: p == "/path/to/upload_clip.py" or real_exists(p)
+        )
+
     @patch("obs_clip_hook.play_audio_cue")
     @patch("obs_clip_hook.subprocess.Popen")
     @patch("obs_clip_hook.find_latest_replay")
     @patch("obs_clip_hook.get_replay_path")
     @patch("obs_clip_hook.detect_game_name")
-    def test_handle_replay_saved_spawns_upload_subprocess(
-        self, mock_detect, mock_replay_path, mock_find, mock_popen, mock_audio_cue, tmp_path
+    def test_handle_replay_saved_sends_job_to_upload_daemon(
+        self, mock_detect, mock_replay_path, mock_find, mock_popen, mock_audio_cue, replay_dir
     ):
-        """Should spawn upload subprocess with correct arguments."""
-        from obs_clip_hook import handle_replay_saved
-
-        # Set up the module state
-        import obs_clip_hook
-
-        obs_clip_hook.upload_script_path = "/path/to/upload_clip.py"
-        obs_clip_hook.python_executable = "python3"
-
-        # Create a test video file
-        video_file = tmp_path / "Replay_2026-01-21_14-30-00.mp4"
-        video_file.write_bytes(b"video")
+        """Should start the upload daemon and send it the clip as a JSON job."""
+        video_file = replay_dir / REPLAY_NAME
 
         mock_detect.return_value = "Valorant"
-        mock_replay_path.return_value = str(tmp_path)
+        mock_replay_path.return_value = str(replay_dir)
         mock_find.return_value = str(video_file)
 
-        # Mock os.path.exists to return True for upload script
-        with patch("os.path.exists", return_value=True):
-            handle_replay_saved()
+        handle_replay_saved()
 
         mock_popen.assert_called_once()
         call_args = mock_popen.call_args[0][0]
-        assert call_args[0] == "python3"
-        assert call_args[1] == "/path/to/upload_clip.py"
-        assert "--file" in call_args
-        assert "--title" in call_args
-        assert "Valorant" in call_args[-1]  # Title includes game name
+        assert call_args == ["python3", "/path/to/upload_clip.py", "--daemon"]
+
+        job = json.loads(mock_popen.return_value.stdin.write.call_args[0][0])
+        assert job["file"].startswith(str(replay_dir))
+        assert "Valorant" in job["title"]  # Title includes game name
 
     @patch("obs_clip_hook.play_audio_cue")
     @patch("obs_clip_hook.subprocess.Popen")
@@ -293,45 +461,47 @@ class TestHandleReplaySaved:
     @patch("obs_clip_hook.get_replay_path")
     @patch("obs_clip_hook.detect_game_name")
     def test_handle_replay_saved_renames_file(
-        self, mock_detect, mock_replay_path, mock_find, mock_popen, mock_audio_cue, tmp_path
+        self, mock_detect, mock_replay_path, mock_find, mock_popen, mock_audio_cue, replay_dir
     ):
         """Should rename the replay file with game name and timestamp."""
-        from obs_clip_hook import handle_replay_saved
-
-        import obs_clip_hook
-
-        obs_clip_hook.upload_script_path = "/path/to/upload_clip.py"
-        obs_clip_hook.python_executable = "python3"
-
-        # Create a test video file
-        video_file = tmp_path / "Replay_2026-01-21_14-30-00.mp4"
-        video_file.write_bytes(b"video")
+        video_file = replay_dir / REPLAY_NAME
 
         mock_detect.return_value = "TestGame"
-        mock_replay_path.return_value = str(tmp_path)
+        mock_replay_path.return_value = str(replay_dir)
         mock_find.return_value = str(video_file)
 
-        with patch("os.path.exists", return_value=True):
-            handle_replay_saved()
+        handle_replay_saved()
 
         # Original file should be renamed
         assert not video_file.exists()
         # New file should exist with game name
-        renamed_files = list(tmp_path.glob("TestGame - *.mp4"))
+        renamed_files = list(replay_dir.glob("TestGame - *.mp4"))
         assert len(renamed_files) == 1
 
+    @patch("obs_clip_hook.play_audio_cue")
+    @patch("obs_clip_hook.subprocess.Popen")
+    @patch("obs_clip_hook.find_latest_replay")
+    @patch("obs_clip_hook.detect_game_name")
+    def test_handle_replay_saved_uses_reported_replay_file(
+        self, mock_detect, mock_find, mock_popen, mock_audio_cue, replay_dir
+    ):
+        """Should use the file OBS reported without scanning the directory."""
+        video_file = replay_dir / REPLAY_NAME
+        mock_detect.return_value = "TestGame"
+
+        handle_replay_saved(str(video_file))
+
+        mock_find.assert_not_called()
+        assert len(list(replay_dir.glob("TestGame - *.mp4"))) == 1
+
     @patch("obs_clip_hook.play_audio_cue")
     @patch("obs_clip_hook.find_latest_replay")
     @patch("obs_clip_hook.get_replay_path")
     def test_handle_replay_saved_logs_warning_when_no_upload_script(
-        self, mock_replay_path, mock_find, mock_audio_cue
+        self, mock_replay_path, mock_find, mock_audio_cue, monkeypatch
     ):
         """Should log warning when upload script path is not configured."""
-        from obs_clip_hook import handle_replay_saved
-
-        import obs_clip_hook
-
-        obs_clip_hook.upload_script_path = ""
+        monkeypatch.setattr(obs_clip_hook, "upload_script_path", "")
 
         handle_replay_saved()
 
@@ -343,50 +513,177 @@ class TestHandleReplaySaved:
 class TestPlayAudioCue:
     """Tests for play_audio_cue function."""
 
-    @patch("obs_clip_hook._run_host_command")
-    def test_play_audio_cue_calls_paplay(self, mock_run, tmp_path):
-        """Should call paplay with the audio file path."""
-        # Create a temporary sounds directory with audio file
+    @pytest.fixture
+    def audio_file(self, tmp_path):
+        """Point the module's audio cue at a temporary sound file."""
         sounds_dir = tmp_path / "sounds"
         sounds_dir.mkdir()
         audio_file = sounds_dir / "clip_saved.wav"
         audio_file.write_bytes(b"fake wav data")
 
-        with patch("obs_clip_hook.Path") as mock_path:
-            # Mock Path(__file__).parent to return tmp_path
-            mock_path.return_value.parent = tmp_path
+        with patch("obs_clip_hook._AUDIO_FILE", str(audio_file)), \
+                patch("obs_clip_hook._AUDIO_FILE_OK", True):
+            yield audio_file
 
-            play_audio_cue()
+    def test_audio_file_resolved_next_to_script(self):
+        """Should resolve the bundled sound relative to the script."""
+        expected = Path(obs_clip_hook.__file__).parent / "sounds" / "clip_saved.wav"
+        assert obs_clip_hook._AUDIO_FILE == str(expected)
+        assert obs_clip_hook._AUDIO_FILE_OK is True
 
-            mock_run.assert_called_once()
-            call_args = mock_run.call_args[0][0]
-            assert call_args[0] == "paplay"
-            assert "clip_saved.wav" in call_args[1]
+    @patch("obs_clip_hook._spawn_host_command")
+    def test_play_audio_cue_calls_paplay(self, mock_run, audio_file):
+        """Should call paplay with the audio file path."""
+        play_audio_cue()
 
-    @patch("obs_clip_hook._run_host_command")
+        mock_run.assert_called_once()
+        call_args = mock_run.call_args[0][0]
+        assert call_args[0] == "paplay"
+        assert call_args[1] == str(audio_file)
+
+    @patch("obs_clip_hook._spawn_host_command")
     def test_play_audio_cue_handles_missing_file(self, mock_run, tmp_path):
         """Should not call paplay when audio file doesn't exist."""
-        with patch("obs_clip_hook.Path") as mock_path:
-            mock_path.return_value.parent = tmp_path
-
+        with patch("obs_clip_hook._AUDIO_FILE", str(tmp_path / "missing.wav")), \
+                patch("obs_clip_hook._AUDIO_FILE_OK", False):
             play_audio_cue()
 
-            mock_run.assert_not_called()
+        mock_run.assert_not_called()
 
-    @patch("obs_clip_hook._run_host_command")
-    def test_play_audio_cue_handles_exception(self, mock_run, tmp_path):
+    @patch("obs_clip_hook._spawn_host_command")
+    def test_play_audio_cue_handles_exception(self, mock_run, audio_file):
         """Should handle exceptions gracefully."""
-        sounds_dir = tmp_path / "sounds"
-        sounds_dir.mkdir()
-        audio_file = sounds_dir / "clip_saved.wav"
-        audio_file.write_bytes(b"fake wav data")
-
         mock_run.side_effect = Exception("paplay failed")
 
-        with patch("obs_clip_hook.Path") as mock_path:
-            mock_path.return_value.parent = tmp_path
+        # Should not raise
+        play_audio_cue()
 
-            # Should not raise
-            play_audio_cue()
+        mock_obs.script_log.assert_called()
+
+
+class TestSpawnHostCommand:
+    """Tests for _spawn_host_command function."""
+
+    @patch("obs_clip_hook.subprocess.Popen")
+    def test_spawn_host_command_discards_output(self, mock_popen):
+        """Should start the command detached with output sent to /dev/null."""
+        from subprocess import DEVNULL
+
+        with patch("obs_clip_hook._IS_FLATPAK", False):
+            _spawn_host_command(["paplay", "/tmp/sound.wav"])
+
+        mock_popen.assert_called_once()
+        assert mock_popen.call_args[0][0] == ["paplay", "/tmp/sound.wav"]
+        kwargs = mock_popen.call_args[1]
+        assert kwargs["stdout"] is DEVNULL
+        assert kwargs["stderr"] is DEVNULL
+        assert kwargs["start_new_session"] is True
+        assert "DISPLAY" in kwargs["env"]
+
+    @patch("obs_clip_hook.subprocess.Popen")
+    def test_spawn_host_command_uses_flatpak_spawn(self, mock_popen):
+        """Should wrap the command in flatpak-spawn inside a Flatpak sandbox."""
+        with patch("obs_clip_hook._IS_FLATPAK", True):
+            _spawn_host_command(["paplay", "/tmp/sound.wav"])
+
+        args = mock_popen.call_args[0][0]
+        assert args[:2] == ["flatpak-spawn", "--host"]
+
+
+class TestUploadDaemon:
+    """Tests for the upload daemon helpers."""
+
+    @pytest.fixture(autouse=True)
+    def configure_paths(self, monkeypatch):
+        """Point the hook at a fake upload script for the duration of a test."""
+        monkeypatch.setattr(obs_clip_hook, "upload_script_path", "/path/to/upload_clip.py")
+        monkeypatch.setattr(obs_clip_hook, "python_executable", "python3")
+
+    @patch("obs_clip_hook.subprocess.Popen")
+    def test_send_upload_job_reuses_running_daemon(self, mock_popen):
+        """Should start one daemon and send every job to it."""
+        mock_popen.return_value.poll.return_value = None
+
+        _send_upload_job("/clips/a.mp4", "Game - A")
+        _send_upload_job("/clips/b.mp4", "Game - B")
+
+        mock_popen.assert_called_once()
+        writes = mock_popen.return_value.stdin.write.call_args_list
+        assert [json.loads(c[0][0])["file"] for c in writes] == ["/clips/a.mp4", "/clips/b.mp4"]
+
+    @patch("obs_clip_hook.subprocess.Popen")
+    def test_send_upload_job_restarts_dead_daemon(self, mock_popen):
+        """Should start a new daemon when the previous one has exited."""
+        dead = MagicMock()
+        dead.poll.return_value = None
+        dead.stdin.write.side_effect = BrokenPipeError
+        alive = MagicMock()
+        alive.poll.return_value = None
+        mock_popen.side_effect = [dead, alive]
+
+        _send_upload_job("/clips/a.mp4", "Game - A")
+
+        assert mock_popen.call_count == 2
+        alive.stdin.write.assert_called_once()
+
+    @patch("obs_clip_hook.subprocess.Popen")
+    def test_send_upload_job_restarts_daemon_when_paths_change(self, mock_popen, monkeypatch):
+        """Should close the old daemon's queue and start one with the new paths."""
+        first, second = MagicMock(), MagicMock()
+        first.poll.return_value = None
+        second.poll.return_value = None
+        mock_popen.side_effect = [first, second]
+
+        _send_upload_job("/clips/a.mp4", "Game - A")
+        monkeypatch.setattr(obs_clip_hook, "python_executable", "/venv/bin/python")
+        _send_upload_job("/clips/b.mp4", "Game - B")
+
+        first.stdin.close.assert_called_once()
+        assert mock_popen.call_args[0][0][0] == "/venv/bin/python"
+
+    @patch("obs_clip_hook.subprocess.Popen")
+    def test_stop_upload_daemon_closes_stdin(self, mock_popen):
+        """Should close the daemon's stdin so it exits after queued uploads."""
+        mock_popen.return_value.poll.return_value = None
+        _send_upload_job("/clips/a.mp4", "Game - A")
+
+        _stop_upload_daemon()
+
+        mock_popen.return_value.stdin.close.assert_called_once()
+
+
+class TestRenameNoReplace:
+    """Tests for _rename_no_replace function."""
+
+    def test_rename_no_replace_moves_file(self, tmp_path):
+        """Should move the file to the new name."""
+        src = tmp_path / "Replay.mp4"
+        src.write_bytes(b"video")
+        dst = tmp_path / "Game - 2026-01-21 14-30.mp4"
+
+        assert _rename_no_replace(src, dst) is True
+        assert not src.exists()
+        assert dst.read_bytes() == b"video"
+
+    def test_rename_no_replace_keeps_existing_destination(self, tmp_path):
+        """Should leave both files alone when the destination already exists."""
+        src = tmp_path / "Replay.mp4"
+        src.write_bytes(b"new clip")
+        dst = tmp_path / "Game - 2026-01-21 14-30.mp4"
+        dst.write_bytes(b"earlier clip")
+
+        assert _rename_no_replace(src, dst) is False
+        assert src.read_bytes() == b"new clip"
+        assert dst.read_bytes() == b"earlier clip"
+
+    def test_rename_no_replace_falls_back_without_hard_links(self, tmp_path):
+        """Should fall back to a plain rename when hard links aren't supported."""
+        src = tmp_path / "Replay.mp4"
+        src.write_bytes(b"video")
+        dst = tmp_path / "Game - 2026-01-21 14-30.mp4"
+
+        with patch("obs_clip_hook.os.link", side_effect=PermissionError("no links")):
+            assert _rename_no_replace(src, dst) is True
 
-            mock_obs.script_log.assert_called()
+        assert not src.exists()
+        assert dst.exists()
@@ -1,28 +1,54 @@
 """Tests for upload_clip.py."""
 
+import errno
+import json
 import logging
+import logging.handlers
+import os
 import sys
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch, mock_open
 
+import httplib2
 import pytest
+import yaml
 
-# Add parent directory to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
+import upload_clip
 from upload_clip import (
     load_config,
     setup_logging,
     send_notification,
+    copy_to_clipboard,
     get_youtube_service,
     upload_video,
     upload_with_retry,
+    process_upload,
+    run_daemon,
+    main,
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_service_cache():
+    """Build the YouTube service afresh in every test."""
+    get_youtube_service.cache_clear()
+    yield
+    get_youtube_service.cache_clear()
+
+
 class TestLoadConfig:
     """Tests for load_config function."""
 
+    @pytest.fixture(autouse=True)
+    def clear_config_cache(self):
+        """Parse config files afresh in every test."""
+        load_config.cache_clear()
+        yield
+        load_config.cache_clear()
+
     def test_load_config_returns_defaults_when_file_missing(self, tmp_path):
         """Should return default config when file doesn't exist."""
         config = load_config(tmp_path / "nonexistent.yaml")
@@ -52,6 +78,18 @@ log_path: /path/to/log.log
         assert config["retry"]["max_attempts"] == 5
         assert config["retry"]["backoff_seconds"] == 10
 
+    def test_load_config_parses_each_file_once(self, tmp_path):
+        """Should reuse the parsed config for repeat loads of the same path."""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("youtube:\n  privacy: private\n")
+
+        with patch("yaml.load", wraps=yaml.load) as mock_load:
+            first = load_config(config_file)
+            second = load_config(config_file)
+
+        assert first is second
+        mock_load.assert_called_once()
+
 
 class TestSetupLogging:
     """Tests for setup_logging function."""
@@ -72,7 +110,26 @@ class TestSetupLogging:
         logger = setup_logging(str(log_path))
 
         assert logger.level == logging.DEBUG
-        assert len(logger.handlers) >= 2  # File and stderr handlers
+        assert [type(h) for h in logger.handlers] == [logging.handlers.QueueHandler]
+        listener_handlers = upload_clip._log_listener.handlers
+        assert {type(h) for h in listener_handlers} == {logging.FileHandler, logging.StreamHandler}
+
+    def test_setup_logging_writes_queued_records_to_file(self, tmp_path):
+        """Should write records to the log file once the listener drains the queue."""
+        log_path = tmp_path / "uploads.log"
+
+        logger = setup_logging(str(log_path))
+        logger.debug("Upload progress: 50%")
+        upload_clip._stop_log_listener()
+
+        assert "DEBUG - Upload progress: 50%" in log_path.read_text()
+
+    def test_setup_logging_replaces_previous_handlers(self, tmp_path):
+        """Should not stack handlers when called more than once."""
+        setup_logging(str(tmp_path / "first.log"))
+        logger = setup_logging(str(tmp_path / "second.log"))
+
+        assert len(logger.handlers) == 1
 
 
 class TestSendNotification:
@@ -106,6 +163,78 @@ class TestSendNotification:
         send_notification("Title", "Message")
 
 
+class TestCopyToClipboard:
+    """Tests for the clipboard helpers."""
+
+    @pytest.fixture
+    def tools(self, monkeypatch):
+        """Pretend both wl-copy and xclip are installed."""
+        monkeypatch.setattr("upload_clip.shutil.which", lambda name: f"/usr/bin/{name}")
+        monkeypatch.delenv("WAYLAND_DISPLAY", raising=False)
+        monkeypatch.delenv("DISPLAY", raising=False)
+
+    def test_find_clipboard_command_prefers_wl_copy_on_wayland(self, tools, monkeypatch):
+        """Should use wl-copy in a Wayland session."""
+        monkeypatch.setenv("WAYLAND_DISPLAY", "wayland-0")
+        monkeypatch.setenv("DISPLAY", ":0")
+
+        assert upload_clip._find_clipboard_command() == ["/usr/bin/wl-copy"]
+
+    def test_find_clipboard_command_uses_xclip_on_x11(self, tools, monkeypatch):
+        """Should use xclip in an X11 session."""
+        monkeypatch.setenv("DISPLAY", ":0")
+
+        assert upload_clip._find_clipboard_command() == ["/usr/bin/xclip", "-selection", "clipboard"]
+
+    @patch("upload_clip.subprocess.run")
+    def test_copy_to_clipboard_runs_cached_command_once(self, mock_run, monkeypatch):
+        """Should pipe the text to the cached command in a single run."""
+        monkeypatch.setattr("upload_clip._CLIPBOARD_CMD", ["/usr/bin/wl-copy"])
+
+        assert copy_to_clipboard("https://youtu.be/abc123") is True
+        mock_run.assert_called_once()
+        assert mock_run.call_args[1]["input"] == b"https://youtu.be/abc123"
+
+    @patch("upload_clip.subprocess.run")
+    def test_copy_to_clipboard_fails_without_tool(self, mock_run, monkeypatch):
+        """Should return False without spawning anything when no tool is installed."""
+        monkeypatch.setattr("upload_clip._CLIPBOARD_CMD", None)
+
+        assert copy_to_clipboard("https://youtu.be/abc123") is False
+        mock_run.assert_not_called()
+
+
+class TestSpawnNotificationWithActions:
+    """Tests for the detached action-notification helper."""
+
+    @patch("upload_clip.subprocess.Popen")
+    def test_spawn_notification_runs_detached_helper(self, mock_popen):
+        """Should hand the URL and config to a detached --notify-url helper."""
+        upload_clip.spawn_notification_with_actions(
+            "https://youtu.be/abc123", Path("/tmp/clipper.yaml"), MagicMock()
+        )
+
+        assert mock_popen.call_args[0][0] == [
+            sys.executable,
+            os.path.abspath(upload_clip.__file__),
+            "--notify-url",
+            "https://youtu.be/abc123",
+            "--config",
+            "/tmp/clipper.yaml",
+        ]
+        assert mock_popen.call_args[1]["start_new_session"] is True
+
+    @patch("upload_clip.send_notification")
+    @patch("upload_clip.subprocess.Popen", side_effect=OSError("no python"))
+    def test_spawn_notification_falls_back_to_basic_notification(self, mock_popen, mock_notify):
+        """Should still show a plain notification if the helper can't start."""
+        upload_clip.spawn_notification_with_actions(
+            "https://youtu.be/abc123", Path("/tmp/clipper.yaml"), MagicMock()
+        )
+
+        mock_notify.assert_called_once_with("Clip Uploaded!", "https://youtu.be/abc123")
+
+
 class TestGetYoutubeService:
     """Tests for get_youtube_service function."""
 
@@ -116,8 +245,8 @@ class TestGetYoutubeService:
         with pytest.raises(FileNotFoundError):
             get_youtube_service(str(tmp_path / "missing_token.json"), logger)
 
-    @patch("upload_clip.build")
-    @patch("upload_clip.Credentials.from_authorized_user_file")
+    @patch("googleapiclient.discovery.build")
+    @patch("google.oauth2.credentials.Credentials.from_authorized_user_file")
     def test_get_youtube_service_builds_service(self, mock_creds, mock_build, tmp_path):
         """Should build YouTube service with valid credentials."""
         token_file = tmp_path / "token.json"
@@ -125,17 +254,39 @@ class TestGetYoutubeService:
 
         mock_creds_instance = MagicMock()
         mock_creds_instance.expired = False
+        mock_creds_instance.expiry = None
         mock_creds.return_value = mock_creds_instance
 
         logger = MagicMock()
 
         get_youtube_service(str(token_file), logger)
 
-        mock_build.assert_called_once_with("youtube", "v3", credentials=mock_creds_instance)
+        mock_build.assert_called_once()
+        assert mock_build.call_args[1]["static_discovery"] is True
+        assert mock_build.call_args[1]["http"].credentials is mock_creds_instance
+
+    @patch("google_auth_httplib2.Request")
+    @patch("googleapiclient.discovery.build")
+    @patch("google.oauth2.credentials.Credentials.from_authorized_user_file")
+    def test_get_youtube_service_refreshes_over_upload_connection(
+        self, mock_creds, mock_build, mock_request, tmp_path
+    ):
+        """Should refresh the token over the same HTTP client the service uploads with."""
+        token_file = tmp_path / "token.json"
+        token_file.write_text('{"token": "test"}')
+
+        mock_creds_instance = MagicMock(expired=True, refresh_token="refresh_token")
+        mock_creds_instance.to_json.return_value = '{"refreshed": "token"}'
+        mock_creds.return_value = mock_creds_instance
+
+        get_youtube_service(str(token_file), MagicMock())
+
+        refresh_http = mock_request.call_args[0][0]
+        assert mock_build.call_args[1]["http"].http is refresh_http
 
-    @patch("google.auth.transport.requests.Request")
-    @patch("upload_clip.build")
-    @patch("upload_clip.Credentials.from_authorized_user_file")
+    @patch("google_auth_httplib2.Request")
+    @patch("googleapiclient.discovery.build")
+    @patch("google.oauth2.credentials.Credentials.from_authorized_user_file")
     def test_get_youtube_service_refreshes_expired_credentials(
         self, mock_creds, mock_build, mock_request, tmp_path
     ):
@@ -155,11 +306,39 @@ class TestGetYoutubeService:
 
         mock_creds_instance.refresh.assert_called_once()
 
+    @pytest.mark.parametrize(
+        "expires_in,should_refresh",
+        [
+            pytest.param(timedelta(minutes=2), True, id="about-to-expire"),
+            pytest.param(timedelta(minutes=30), False, id="still-fresh"),
+        ],
+    )
+    @patch("google_auth_httplib2.Request")
+    @patch("googleapiclient.discovery.build")
+    @patch("google.oauth2.credentials.Credentials.from_authorized_user_file")
+    def test_get_youtube_service_refreshes_token_close_to_expiry(
+        self, mock_creds, mock_build, mock_request, expires_in, should_refresh, tmp_path
+    ):
+        """Should refresh a token that expires within the refresh margin."""
+        token_file = tmp_path / "token.json"
+        token_file.write_text('{"token": "test"}')
+
+        mock_creds_instance = MagicMock()
+        mock_creds_instance.expired = False
+        mock_creds_instance.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + expires_in
+        mock_creds_instance.refresh_token = "refresh_token"
+        mock_creds_instance.to_json.return_value = '{"refreshed": "token"}'
+        mock_creds.return_value = mock_creds_instance
+
+        get_youtube_service(str(token_file), MagicMock())
+
+        assert mock_creds_instance.refresh.called is should_refresh
+
 
 class TestUploadVideo:
     """Tests for upload_video function."""
 
-    @patch("upload_clip.MediaFileUpload")
+    @patch("googleapiclient.http.MediaIoBaseUpload")
     def test_upload_video_returns_video_id(self, mock_media, mock_youtube_service, temp_video_file):
         """Should return video ID on successful upload."""
         logger = MagicMock()
@@ -175,7 +354,7 @@ class TestUploadVideo:
 
         assert video_id == "test_video_id_123"
 
-    @patch("upload_clip.MediaFileUpload")
+    @patch("googleapiclient.http.MediaIoBaseUpload")
     def test_upload_video_sets_correct_metadata(self, mock_media, mock_youtube_service, temp_video_file):
         """Should set correct video metadata."""
         logger = MagicMock()
@@ -199,35 +378,180 @@ class TestUploadVideo:
         assert call_kwargs["body"]["status"]["privacyStatus"] == "private"
         assert call_kwargs["body"]["snippet"]["categoryId"] == "20"  # Gaming
 
+    @pytest.mark.parametrize(
+        "chunk_size_mb,expected",
+        [
+            pytest.param(None, 8 * 1024 * 1024, id="default"),
+            pytest.param(10, 10 * 1024 * 1024, id="configured"),
+            pytest.param(0.3, 256 * 1024, id="rounded-to-256kb"),
+        ],
+    )
+    @patch("googleapiclient.http.MediaIoBaseUpload")
+    def test_upload_video_uses_chunk_size(
+        self, mock_media, chunk_size_mb, expected, mock_youtube_service, temp_video_file
+    ):
+        """Should upload in chunks of the configured size, in 256KB multiples."""
+        kwargs = {} if chunk_size_mb is None else {"chunk_size_mb": chunk_size_mb}
 
-class TestUploadWithRetry:
-    """Tests for upload_with_retry function."""
+        upload_video(
+            youtube=mock_youtube_service,
+            file_path=str(temp_video_file),
+            title="Test Title",
+            description="Test Description",
+            privacy="unlisted",
+            logger=MagicMock(),
+            resumable_threshold_mb=0,
+            **kwargs,
+        )
 
-    @patch("upload_clip.upload_video")
-    def test_upload_with_retry_succeeds_on_first_attempt(self, mock_upload, mock_youtube_service):
-        """Should return video ID when upload succeeds immediately."""
-        mock_upload.return_value = "video_123"
+        assert mock_media.call_args[1]["chunksize"] == expected
+
+    @patch("googleapiclient.http.MediaIoBaseUpload")
+    def test_upload_video_throttles_progress_logging(self, mock_media, mock_youtube_service, temp_video_file):
+        """Should log progress only after it advances by at least 5%."""
+        request = mock_youtube_service.videos().insert.return_value
+        request.next_chunk.side_effect = [
+            (SimpleNamespace(progress=lambda p=p: p, resumable_progress=0), None)
+            for p in (0.01, 0.03, 0.06, 0.08, 0.4)
+        ] + [(None, {"id": "test_video_id_123"})]
         logger = MagicMock()
 
-        result = upload_with_retry(
+        upload_video(
             youtube=mock_youtube_service,
-            file_path="/path/to/video.mp4",
-            title="Test",
-            description="Desc",
+            file_path=str(temp_video_file),
+            title="Test Title",
+            description="Test Description",
             privacy="unlisted",
-            max_attempts=3,
-            backoff_seconds=1,
             logger=logger,
+            resumable_threshold_mb=0,
         )
 
-        assert result == "video_123"
-        assert mock_upload.call_count == 1
+        messages = [c[0][0] for c in logger.debug.call_args_list]
+        assert messages == ["Upload progress: 6%", "Upload progress: 40%"]
+
+    @pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="needs posix_fadvise")
+    @patch("googleapiclient.http.MediaIoBaseUpload")
+    def test_upload_video_prefetches_next_chunk(
+        self, mock_media, mock_youtube_service, temp_video_file, monkeypatch
+    ):
+        """Should ask the kernel to read ahead the chunk after the one being sent."""
+        chunk = 1024 * 1024
+        request = mock_youtube_service.videos().insert.return_value
+        request.next_chunk.side_effect = [
+            (SimpleNamespace(progress=lambda: 0.25, resumable_progress=chunk), None),
+            (None, {"id": "test_video_id_123"}),
+        ]
+        advice = []
+        monkeypatch.setattr(
+            "upload_clip.os.posix_fadvise", lambda fd, offset, length, hint: advice.append((offset, length, hint))
+        )
+
+        upload_video(
+            youtube=mock_youtube_service,
+            file_path=str(temp_video_file),
+            title="Test Title",
+            description="Test Description",
+            privacy="unlisted",
+            logger=MagicMock(),
+            chunk_size_mb=1,
+            resumable_threshold_mb=0,
+        )
+
+        assert advice == [
+            (0, 0, os.POSIX_FADV_SEQUENTIAL),
+            (0, 2 * chunk, os.POSIX_FADV_WILLNEED),
+            (2 * chunk, chunk, os.POSIX_FADV_WILLNEED),
+        ]
+
+    @patch("googleapiclient.http.MediaIoBaseUpload")
+    def test_upload_video_sends_small_clip_in_one_request(
+        self, mock_media, mock_youtube_service, temp_video_file
+    ):
+        """Should skip the resumable session for clips under the threshold."""
+        video_id = upload_video(
+            youtube=mock_youtube_service,
+            file_path=str(temp_video_file),
+            title="Test Title",
+            description="Test Description",
+            privacy="unlisted",
+            logger=MagicMock(),
+        )
+
+        assert video_id == "test_video_id_123"
+        assert mock_media.call_args[1]["resumable"] is False
+        request = mock_youtube_service.videos().insert.return_value
+        request.execute.assert_called_once()
+        request.next_chunk.assert_not_called()
+
+    @patch("upload_clip.os.path.getsize")
+    @patch("googleapiclient.http.MediaIoBaseUpload")
+    def test_upload_video_uses_given_file_size(
+        self, mock_media, mock_getsize, mock_youtube_service, temp_video_file
+    ):
+        """Should decide on a resumable upload from the given size without a stat."""
+        upload_video(
+            youtube=mock_youtube_service,
+            file_path=str(temp_video_file),
+            title="Test Title",
+            description="Test Description",
+            privacy="unlisted",
+            logger=MagicMock(),
+            file_size=100 * 1024 * 1024,
+        )
+
+        mock_getsize.assert_not_called()
+        assert mock_media.call_args[1]["resumable"] is True
+
+    @patch("googleapiclient.http.MediaIoBaseUpload")
+    def test_upload_video_uses_resumable_upload_for_large_clip(
+        self, mock_media, mock_youtube_service, temp_video_file
+    ):
+        """Should upload clips at or over the threshold in resumable chunks."""
+        video_id = upload_video(
+            youtube=mock_youtube_service,
+            file_path=str(temp_video_file),
+            title="Test Title",
+            description="Test Description",
+            privacy="unlisted",
+            logger=MagicMock(),
+            resumable_threshold_mb=0,
+        )
+
+        assert video_id == "test_video_id_123"
+        assert mock_media.call_args[1]["resumable"] is True
+        assert mock_media.call_args[0][0].closed  # file closed once the upload finishes
+        request = mock_youtube_service.videos().insert.return_value
+        request.next_chunk.assert_called_once()
+        request.execute.assert_not_called()
 
-    @patch("upload_clip.time.sleep")
+
+class TestUploadWithRetry:
+    """Tests for upload_with_retry function."""
+
+    @pytest.mark.parametrize(
+        "side_effect,backoff,expected_result,expected_sleeps,expected_attempts",
+        [
+            pytest.param(["video_123"], 1, "video_123", [], 1, id="first-attempt"),
+            pytest.param([ConnectionError("Network error"), "video_456"], 1, "video_456", [1], 2, id="one-retry"),
+            pytest.param(
+                [OSError(errno.ENETUNREACH, "Network is unreachable"), "video_456"], 1, "video_456", [1], 2,
+                id="network-unreachable",
+            ),
+            pytest.param(
+                [ConnectionError("Error 1"), TimeoutError("Error 2"), "video_789"], 2, "video_789", [2, 4], 3,
+                id="exponential-backoff",
+            ),
+        ],
+    )
     @patch("upload_clip.upload_video")
-    def test_upload_with_retry_retries_on_failure(self, mock_upload, mock_sleep, mock_youtube_service):
-        """Should retry on transient failures."""
-        mock_upload.side_effect = [Exception("Network error"), "video_456"]
+    def test_upload_with_retry_recovers(
+        self, mock_upload, side_effect, backoff, expected_result, expected_sleeps, expected_attempts,
+        mock_youtube_service, _no_sleep, monkeypatch,
+    ):
+        """Should retry transient failures with exponential backoff until one succeeds."""
+        # Take the top of each jitter range so the backoff ceiling is visible
+        monkeypatch.setattr("upload_clip.random.uniform", lambda low, high: high)
+        mock_upload.side_effect = side_effect
         logger = MagicMock()
 
         result = upload_with_retry(
@@ -237,24 +561,18 @@ class TestUploadWithRetry:
             description="Desc",
             privacy="unlisted",
             max_attempts=3,
-            backoff_seconds=1,
+            backoff_seconds=backoff,
             logger=logger,
         )
 
-        assert result == "video_456"
-        assert mock_upload.call_count == 2
-        mock_sleep.assert_called_once_with(1)  # First backoff
+        assert result == expected_result
+        assert mock_upload.call_count == expected_attempts
+        assert _no_sleep == expected_sleeps
 
-    @patch("upload_clip.time.sleep")
     @patch("upload_clip.upload_video")
-    def test_upload_with_retry_uses_exponential_backoff(self, mock_upload, mock_sleep, mock_youtube_service):
-        """Should use exponential backoff between retries."""
-        mock_upload.side_effect = [
-            Exception("Error 1"),
-            Exception("Error 2"),
-            "video_789",
-        ]
-        logger = MagicMock()
+    def test_upload_with_retry_jitters_and_caps_backoff(self, mock_upload, mock_youtube_service, _no_sleep):
+        """Should wait a random time no longer than the capped exponential backoff."""
+        mock_upload.side_effect = [ConnectionError("Error")] * 4 + ["video_123"]
 
         upload_with_retry(
             youtube=mock_youtube_service,
@@ -262,24 +580,23 @@ class TestUploadWithRetry:
             title="Test",
             description="Desc",
             privacy="unlisted",
-            max_attempts=3,
-            backoff_seconds=2,
-            logger=logger,
+            max_attempts=5,
+            backoff_seconds=10,
+            logger=MagicMock(),
+            max_backoff_seconds=25,
         )
 
-        # Should backoff: 2 seconds, then 4 seconds
-        assert mock_sleep.call_count == 2
-        mock_sleep.assert_any_call(2)
-        mock_sleep.assert_any_call(4)
+        ceilings = [10, 20, 25, 25]
+        assert len(_no_sleep) == len(ceilings)
+        assert all(0 <= wait <= ceiling for wait, ceiling in zip(_no_sleep, ceilings))
 
-    @patch("upload_clip.time.sleep")
     @patch("upload_clip.upload_video")
-    def test_upload_with_retry_raises_after_max_attempts(self, mock_upload, mock_sleep, mock_youtube_service):
+    def test_upload_with_retry_raises_after_max_attempts(self, mock_upload, mock_youtube_service):
         """Should raise last error after exhausting all attempts."""
-        mock_upload.side_effect = Exception("Persistent error")
+        mock_upload.side_effect = ConnectionError("Persistent error")
         logger = MagicMock()
 
-        with pytest.raises(Exception, match="Persistent error"):
+        with pytest.raises(ConnectionError, match="Persistent error"):
             upload_with_retry(
                 youtube=mock_youtube_service,
                 file_path="/path/to/video.mp4",
@@ -298,8 +615,7 @@ class TestUploadWithRetry:
         """Should raise immediately on non-retryable HTTP errors."""
         from googleapiclient.errors import HttpError
 
-        mock_response = MagicMock()
-        mock_response.status = 403  # Forbidden - not retryable
+        mock_response = SimpleNamespace(status=403, reason="Forbidden")  # not retryable
         mock_upload.side_effect = HttpError(mock_response, b"Forbidden")
         logger = MagicMock()
 
@@ -316,3 +632,298 @@ class TestUploadWithRetry:
             )
 
         assert mock_upload.call_count == 1  # No retries
+
+    @pytest.mark.parametrize(
+        "retry_after,expected_sleep",
+        [
+            pytest.param("120", 120, id="seconds"),
+            pytest.param("3600", 300, id="capped"),
+            pytest.param(
+                format_datetime(datetime.now(timezone.utc) + timedelta(seconds=90), usegmt=True),
+                90, id="http-date",
+            ),
+        ],
+    )
+    @patch("upload_clip.upload_video")
+    def test_upload_with_retry_honors_retry_after(
+        self, mock_upload, retry_after, expected_sleep, mock_youtube_service, _no_sleep
+    ):
+        """Should wait at least as long as the server's Retry-After on a 5xx."""
+        from googleapiclient.errors import HttpError
+
+        resp = httplib2.Response({"status": 503, "retry-after": retry_after})
+        mock_upload.side_effect = [HttpError(resp, b"Unavailable"), "video_123"]
+
+        upload_with_retry(
+            youtube=mock_youtube_service,
+            file_path="/path/to/video.mp4",
+            title="Test",
+            description="Desc",
+            privacy="unlisted",
+            max_attempts=3,
+            backoff_seconds=1,
+            logger=MagicMock(),
+        )
+
+        assert _no_sleep == [pytest.approx(expected_sleep, abs=2)]
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            pytest.param(FileNotFoundError("missing.mp4"), id="missing-file"),
+            pytest.param(PermissionError(errno.EACCES, "Permission denied"), id="unreadable-file"),
+            pytest.param(ValueError("bad metadata"), id="programming-error"),
+        ],
+    )
+    @patch("upload_clip.upload_video")
+    def test_upload_with_retry_raises_immediately_on_permanent_error(
+        self, mock_upload, error, mock_youtube_service, _no_sleep
+    ):
+        """Should not retry errors that aren't transient network failures."""
+        mock_upload.side_effect = error
+
+        with pytest.raises(type(error)):
+            upload_with_retry(
+                youtube=mock_youtube_service,
+                file_path="/path/to/video.mp4",
+                title="Test",
+                description="Desc",
+                privacy="unlisted",
+                max_attempts=3,
+                backoff_seconds=1,
+                logger=MagicMock(),
+            )
+
+        assert mock_upload.call_count == 1
+        assert _no_sleep == []
+
+
+class TestProcessUpload:
+    """Tests for process_upload function."""
+
+    @patch("upload_clip.send_notification")
+    def test_process_upload_fails_for_missing_file(self, mock_notify, sample_config, tmp_path):
+        """Should notify and return False when the clip doesn't exist."""
+        logger = MagicMock()
+
+        result = process_upload(
+            str(tmp_path / "missing.mp4"), "Title", sample_config, tmp_path / "config.yaml", logger
+        )
+
+        assert result is False
+        assert mock_notify.call_args[0][0] == "Upload Failed"
+
+    @patch("upload_clip.spawn_notification_with_actions")
+    @patch("upload_clip.upload_with_retry", return_value="abc123")
+    @patch("upload_clip.get_youtube_service")
+    def test_process_upload_notifies_with_video_url(
+        self, mock_service, mock_upload, mock_notify, sample_config, temp_video_file
+    ):
+        """Should upload the clip and notify with its YouTube link."""
+        logger = MagicMock()
+        config_path = Path("/tmp/clipper.yaml")
+
+        result = process_upload(str(temp_video_file), "Title", sample_config, config_path, logger)
+
+        assert result is True
+        mock_notify.assert_called_once_with("https://youtu.be/abc123", config_path, logger)
+
+    @patch("upload_clip.spawn_notification_with_actions")
+    @patch("upload_clip.upload_with_retry", return_value="abc123")
+    @patch("upload_clip.get_youtube_service")
+    def test_process_upload_passes_file_size_down(
+        self, mock_service, mock_upload, mock_notify, sample_config, temp_video_file
+    ):
+        """Should stat the clip once and hand its size to the uploader."""
+        process_upload(
+            str(temp_video_file), "Title", sample_config, Path("/tmp/clipper.yaml"), MagicMock()
+        )
+
+        assert mock_upload.call_args[1]["file_size"] == temp_video_file.stat().st_size
+
+
+class TestRunDaemon:
+    """Tests for run_daemon function."""
+
+    @patch("upload_clip.process_upload")
+    def test_run_daemon_processes_each_job(self, mock_process, sample_config, monkeypatch):
+        """Should process one upload per JSON line until EOF."""
+        import io
+
+        monkeypatch.setattr(
+            "sys.stdin",
+            io.StringIO(
+                '{"file": "/clips/a.mp4", "title": "A"}\n'
+                "\n"
+                '{"file": "/clips/b.mp4", "title": "B"}\n'
+            ),
+        )
+        logger = MagicMock()
+
+        run_daemon(sample_config, Path("/tmp/clipper.yaml"), logger)
+
+        assert [c[0][:2] for c in mock_process.call_args_list] == [
+            ("/clips/a.mp4", "A"),
+            ("/clips/b.mp4", "B"),
+        ]
+
+    @patch("upload_clip.process_upload")
+    def test_run_daemon_skips_malformed_jobs(self, mock_process, sample_config, monkeypatch):
+        """Should log and skip lines that aren't valid jobs."""
+        import io
+
+        monkeypatch.setattr(
+            "sys.stdin",
+            io.StringIO('not json\n{"file": "/clips/a.mp4"}\n{"file": "/c.mp4", "title": "C"}\n'),
+        )
+        logger = MagicMock()
+
+        run_daemon(sample_config, Path("/tmp/clipper.yaml"), logger)
+
+        mock_process.assert_called_once()
+        assert logger.warning.call_count == 2
+
+    @patch("upload_clip.send_notification")
+    @patch("upload_clip.spawn_notification_with_actions")
+    @patch("upload_clip.upload_with_retry", return_value="abc123")
+    @patch("upload_clip.get_youtube_service")
+    def test_run_daemon_survives_unreadable_clip_path(
+        self, mock_service, mock_upload, mock_spawn, mock_notify, sample_config, temp_video_file, monkeypatch
+    ):
+        """Should report a bad clip path and still upload the jobs queued behind it."""
+        import io
+
+        bad_path = temp_video_file / "nested.mp4"  # a file used as a directory
+        jobs = [
+            json.dumps({"file": str(bad_path), "title": "Bad"}),
+            json.dumps({"file": str(temp_video_file), "title": "Good"}),
+        ]
+        monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(jobs) + "\n"))
+
+        run_daemon(sample_config, Path("/tmp/clipper.yaml"), MagicMock())
+
+        assert mock_notify.call_args[0][0] == "Upload Failed"
+        mock_upload.assert_called_once()
+        assert mock_upload.call_args[1]["file_path"] == str(temp_video_file)
+        mock_spawn.assert_called_once()
+
+    @patch("upload_clip.spawn_notification_with_actions")
+    @patch("upload_clip.upload_with_retry", return_value="abc123")
+    @patch("googleapiclient.discovery.build")
+    @patch("google.oauth2.credentials.Credentials.from_authorized_user_file")
+    def test_run_daemon_reuses_youtube_service(
+        self, mock_creds, mock_build, mock_upload, mock_notify, sample_config, temp_video_file, monkeypatch
+    ):
+        """Should build the YouTube service once for all jobs."""
+        import io
+
+        Path(sample_config["token_path"]).write_text('{"token": "test"}')
+        mock_creds.return_value = MagicMock(expired=False, expiry=None)
+        job = json.dumps({"file": str(temp_video_file), "title": "A"})
+        monkeypatch.setattr("sys.stdin", io.StringIO(f"{job}\n{job}\n"))
+
+        run_daemon(sample_config, Path("/tmp/clipper.yaml"), MagicMock())
+
+        assert mock_upload.call_count == 2
+        mock_build.assert_called_once()
+
+    @pytest.mark.parametrize(
+        "auth_error",
+        [
+            pytest.param("refresh", id="refresh-error"),
+            pytest.param("401", id="http-401"),
+        ],
+    )
+    @patch("upload_clip.send_notification")
+    @patch("upload_clip.spawn_notification_with_actions")
+    @patch("upload_clip.upload_with_retry")
+    @patch("googleapiclient.discovery.build")
+    @patch("google.oauth2.credentials.Credentials.from_authorized_user_file")
+    def test_run_daemon_rebuilds_service_after_auth_error(
+        self, mock_creds, mock_build, mock_upload, mock_spawn, mock_notify, auth_error,
+        sample_config, temp_video_file, monkeypatch,
+    ):
+        """Should rebuild the YouTube service after the credentials are rejected."""
+        import io
+        from google.auth.exceptions import RefreshError
+        from googleapiclient.errors import HttpError
+
+        if auth_error == "refresh":
+            error = RefreshError("invalid_grant")
+        else:
+            error = HttpError(httplib2.Response({"status": 401}), b"Unauthorized")
+        Path(sample_config["token_path"]).write_text('{"token": "test"}')
+        mock_creds.return_value = MagicMock(expired=False, expiry=None)
+        mock_upload.side_effect = [error, "abc123"]
+        job = json.dumps({"file": str(temp_video_file), "title": "A"})
+        monkeypatch.setattr("sys.stdin", io.StringIO(f"{job}\n{job}\n"))
+
+        run_daemon(sample_config, Path("/tmp/clipper.yaml"), MagicMock())
+
+        assert mock_build.call_count == 2
+        mock_spawn.assert_called_once()
+
+
+class TestMain:
+    """Tests for main function."""
+
+    def test_main_requires_file_and_title_without_daemon(self, monkeypatch):
+        """Should exit with a usage error when --file/--title are missing."""
+        monkeypatch.setattr("sys.argv", ["upload_clip.py", "--file", "/clips/a.mp4"])
+
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+
+        assert exc_info.value.code == 2
+
+    @pytest.mark.slow
+    def test_import_defers_google_and_yaml_libraries(self):
+        """Should not import yaml or the Google clients until they're needed."""
+        import subprocess
+
+        code = (
+            "import sys, upload_clip; "
+            "print(sorted(m for m in ('yaml', 'googleapiclient', 'google.oauth2', 'httplib2')"
+            " if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(upload_clip.__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "[]"
+
+    @patch("upload_clip.subprocess.Popen")
+    @patch("upload_clip.upload_with_retry", return_value="abc123")
+    @patch("upload_clip.get_youtube_service")
+    def test_main_passes_config_to_notification_helper(
+        self, mock_service, mock_upload, mock_popen, sample_config, temp_video_file, tmp_path, monkeypatch
+    ):
+        """Should start the notification helper with the --config it was given."""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.safe_dump(sample_config))
+        monkeypatch.setattr(
+            "sys.argv",
+            ["upload_clip.py", "--file", str(temp_video_file), "--title", "Title", "--config", str(config_file)],
+        )
+
+        main()
+
+        assert mock_popen.call_args[0][0][-2:] == ["--config", str(config_file)]
+
+    @patch("upload_clip.send_notification_with_actions")
+    def test_main_notify_url_shows_action_notification(self, mock_notify, sample_config, tmp_path, monkeypatch):
+        """Should run the blocking action notification when started as the helper."""
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.safe_dump(sample_config))
+        monkeypatch.setattr(
+            "sys.argv",
+            ["upload_clip.py", "--config", str(config_file), "--notify-url", "https://youtu.be/abc123"],
+        )
+
+        main()
+
+        assert mock_notify.call_args[0][2] == "https://youtu.be/abc123"
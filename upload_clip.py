@@ -1,33 +1,76 @@
 #!/usr/bin/env python3
 """
 Upload a video clip to YouTube with retry logic and desktop notifications.
-Designed to be spawned as a subprocess by obs_clip_hook.py.
+Designed to be spawned as a subprocess by obs_clip_hook.py, either once per
+clip (--file/--title) or as a long-lived worker fed jobs on stdin (--daemon).
 """
 
 import argparse
+import atexit
+import functools
+import http.client
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import shutil
 import subprocess
 import sys
 import time
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from typing import Optional
 
-import yaml
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
+# yaml and the Google client libraries are imported where they're used:
+# they account for most of the startup time, which fail-fast paths (bad
+# arguments, missing clip) shouldn't pay.
 
 DEFAULT_CONFIG_PATH = Path.home() / ".config" / "obs-yt-clipper" / "config.yaml"
-
+DEFAULT_CHUNK_SIZE_MB = 8
+DEFAULT_RESUMABLE_THRESHOLD_MB = 5
+DEFAULT_MAX_BACKOFF_SECONDS = 300
+# Socket timeout for API requests, so a stalled connection fails and retries
+HTTP_TIMEOUT_SECONDS = 60
+# Server-side failures worth retrying; other HTTP errors (bad request, auth,
+# quota) will fail the same way every time
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+# Transport failures worth retrying, along with httplib2's own errors. OSError
+# covers socket, SSL and timeout errors as well as ENETUNREACH/EHOSTUNREACH
+# from connect(), which httplib2 re-raises unwrapped when the network drops.
+RETRYABLE_EXCEPTIONS = (
+    http.client.HTTPException,
+    OSError,
+)
+# OSErrors about the clip itself, which no retry will fix
+PERMANENT_OS_ERRORS = (
+    FileNotFoundError,
+    PermissionError,
+    IsADirectoryError,
+    NotADirectoryError,
+)
+# Kernel readahead hints for the clip file; not available on every platform
+_HAS_FADVISE = hasattr(os, "posix_fadvise")
+# Refresh the access token if it expires within this window, so an upload
+# doesn't start with a token that runs out partway through
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+@functools.lru_cache(maxsize=4)
 def load_config(config_path: Path) -> dict:
-    """Load configuration from YAML file."""
+    """Load configuration from YAML file.
+
+    Parsed once per path per process; callers must not mutate the result.
+    """
     if not config_path.exists():
         return {
             "youtube": {
                 "privacy": "unlisted",
                 "description_template": "Recorded on {date}",
+                "chunk_size_mb": DEFAULT_CHUNK_SIZE_MB,
+                "resumable_threshold_mb": DEFAULT_RESUMABLE_THRESHOLD_MB,
             },
             "credentials_path": str(Path.home() / ".config" / "obs-yt-clipper" / "credentials.json"),
             "token_path": str(Path.home() / ".config" / "obs-yt-clipper" / "token.json"),
@@ -35,15 +78,43 @@ def load_config(config_path: Path) -> dict:
             "retry": {
                 "max_attempts": 3,
                 "backoff_seconds": 30,
+                "max_backoff_seconds": DEFAULT_MAX_BACKOFF_SECONDS,
             },
         }
 
+    import yaml
+
+    # Prefer the libyaml C parser when PyYAML was built with it
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(config_path) as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=loader)
+
+
+# Writes queued log records to the real handlers on a background thread
+_log_listener = None
+
+
+def _stop_log_listener() -> None:
+    """Flush queued log records and close the log file."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
+atexit.register(_stop_log_listener)
 
 
 def setup_logging(log_path: str) -> logging.Logger:
-    """Set up logging to file and stderr."""
+    """Set up logging to file and stderr.
+
+    The logger only enqueues records; a QueueListener thread does the
+    formatting and writing, so logging never blocks the upload loop on I/O.
+    """
+    global _log_listener
+
     log_file = Path(log_path)
     log_file.parent.mkdir(parents=True, exist_ok=True)
 
@@ -62,8 +133,17 @@ def setup_logging(log_path: str) -> logging.Logger:
         logging.Formatter("%(levelname)s: %(message)s")
     )
 
-    logger.addHandler(file_handler)
-    logger.addHandler(stderr_handler)
+    # Replace any listener (and its queue handler) from an earlier call
+    _stop_log_listener()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    log_queue = queue.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stderr_handler, respect_handler_level=True
+    )
+    _log_listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     return logger
 
@@ -80,32 +160,39 @@ def send_notification(title: str, message: str, urgency: str = "normal") -> None
         pass  # notify-send not available
 
 
+def _find_clipboard_command():
+    """Pick the clipboard tool for this session: wl-copy on Wayland, xclip on X11."""
+    wl_copy = shutil.which("wl-copy")
+    xclip = shutil.which("xclip")
+    wl_cmd = [wl_copy] if wl_copy else None
+    x_cmd = [xclip, "-selection", "clipboard"] if xclip else None
+
+    if os.environ.get("WAYLAND_DISPLAY"):
+        return wl_cmd or x_cmd
+    if os.environ.get("DISPLAY"):
+        return x_cmd or wl_cmd
+    return wl_cmd or x_cmd
+
+
+# Resolved once at startup; None when no clipboard tool is installed
+_CLIPBOARD_CMD = _find_clipboard_command()
+
+
 def copy_to_clipboard(text: str) -> bool:
     """Copy text to clipboard using wl-copy (Wayland) or xclip (X11)."""
-    # Try wl-copy first (Wayland)
-    try:
-        subprocess.run(
-            ["wl-copy", text],
-            check=True,
-            capture_output=True,
-        )
-        return True
-    except (FileNotFoundError, subprocess.CalledProcessError):
-        pass
+    if _CLIPBOARD_CMD is None:
+        return False
 
-    # Fall back to xclip (X11)
     try:
         subprocess.run(
-            ["xclip", "-selection", "clipboard"],
+            _CLIPBOARD_CMD,
             input=text.encode(),
             check=True,
             capture_output=True,
         )
         return True
     except (FileNotFoundError, subprocess.CalledProcessError):
-        pass
-
-    return False
+        return False
 
 
 def send_notification_with_actions(
@@ -158,8 +245,59 @@ def send_notification_with_actions(
         send_notification(title, message)
 
 
+def spawn_notification_with_actions(url: str, config_path: Path, logger: logging.Logger) -> None:
+    """Show the "Clip Uploaded!" notification from a detached helper process.
+
+    notify-send with actions blocks until the user clicks or it times out;
+    running it in its own process means neither the next queued upload nor
+    the uploader's exit waits on the user. The helper gets the same config
+    so it logs to the configured log_path.
+    """
+    try:
+        subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--notify-url",
+                url,
+                "--config",
+                str(config_path),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError as e:
+        logger.warning(f"Could not start notification helper: {e}")
+        send_notification("Clip Uploaded!", url)
+
+
+def _token_is_stale(creds) -> bool:
+    """Whether the access token has expired or will within TOKEN_REFRESH_MARGIN."""
+    if creds.expired:
+        return True
+    if creds.expiry is None:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now < TOKEN_REFRESH_MARGIN
+
+
+@functools.lru_cache(maxsize=1)
 def get_youtube_service(token_path: str, logger: logging.Logger):
-    """Build YouTube API service using cached credentials."""
+    """Build YouTube API service using cached credentials.
+
+    The service is built once and reused for every upload in the daemon;
+    its transport refreshes the access token whenever it runs out. Failures
+    aren't cached, so a missing token is checked again on the next clip, and
+    process_upload drops the cached service when its credentials are rejected.
+    """
+    import httplib2
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp, Request
+    from googleapiclient.discovery import build
+
     token_file = Path(token_path)
 
     if not token_file.exists():
@@ -172,14 +310,21 @@ def get_youtube_service(token_path: str, logger: logging.Logger):
         scopes=["https://www.googleapis.com/auth/youtube.upload"]
     )
 
-    if creds.expired and creds.refresh_token:
-        from google.auth.transport.requests import Request
+    # One HTTP client for the token refresh and the upload, so both share
+    # its connection pool
+    http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+
+    if _token_is_stale(creds) and creds.refresh_token:
         logger.info("Refreshing expired credentials...")
-        creds.refresh(Request())
+        creds.refresh(Request(http))
         with open(token_path, "w") as f:
             f.write(creds.to_json())
 
-    return build("youtube", "v3", credentials=creds)
+    # Pin the discovery document bundled with google-api-python-client
+    # explicitly; this is already the default for build() in 2.x
+    return build(
+        "youtube", "v3", http=AuthorizedHttp(creds, http=http), static_discovery=True
+    )
 
 
 def upload_video(
@@ -189,8 +334,18 @@ def upload_video(
     description: str,
     privacy: str,
     logger: logging.Logger,
+    chunk_size_mb: float = DEFAULT_CHUNK_SIZE_MB,
+    resumable_threshold_mb: float = DEFAULT_RESUMABLE_THRESHOLD_MB,
+    file_size: Optional[int] = None,
 ) -> str:
-    """Upload a video to YouTube and return the video ID."""
+    """Upload a video to YouTube and return the video ID.
+
+    Clips smaller than resumable_threshold_mb go up in a single request;
+    larger ones use a resumable session so a dropped chunk can be resent.
+    Pass file_size if the caller has already stat'ed the file.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
     body = {
         "snippet": {
             "title": title,
@@ -203,28 +358,83 @@ def upload_video(
         },
     }
 
-    media = MediaFileUpload(
-        file_path,
-        mimetype="video/mp4",
-        resumable=True,
-        chunksize=1024 * 1024,  # 1MB chunks
-    )
+    if file_size is None:
+        file_size = os.path.getsize(file_path)
+    resumable = file_size >= resumable_threshold_mb * 1024 * 1024
+
+    with open(file_path, "rb") as f:
+        if _HAS_FADVISE:
+            # The clip is read front to back once; ask for aggressive readahead
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        if resumable:
+            # Each chunk is its own request; chunks must be multiples of 256KB
+            chunksize = max(1, round(chunk_size_mb * 4)) * 256 * 1024
+            media = MediaIoBaseUpload(
+                f,
+                mimetype="video/mp4",
+                resumable=True,
+                chunksize=chunksize,
+            )
+        else:
+            media = MediaIoBaseUpload(f, mimetype="video/mp4", resumable=False)
 
-    request = youtube.videos().insert(
-        part="snippet,status",
-        body=body,
-        media_body=media,
-    )
+        request = youtube.videos().insert(
+            part="snippet,status",
+            body=body,
+            media_body=media,
+        )
 
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-        if status:
-            logger.debug(f"Upload progress: {int(status.progress() * 100)}%")
+        if not resumable:
+            return request.execute()["id"]
+
+        if _HAS_FADVISE:
+            # Keep the chunk after the one being sent on its way into the page
+            # cache, so reading it doesn't stall the next request
+            os.posix_fadvise(f.fileno(), 0, 2 * chunksize, os.POSIX_FADV_WILLNEED)
+
+        response = None
+        last_logged_pct = 0
+        while response is None:
+            status, response = request.next_chunk()
+            if status:
+                if _HAS_FADVISE:
+                    os.posix_fadvise(
+                        f.fileno(), status.resumable_progress + chunksize, chunksize,
+                        os.POSIX_FADV_WILLNEED,
+                    )
+                # Log in steps of at least 5% rather than once per chunk
+                pct = int(status.progress() * 100)
+                if pct >= last_logged_pct + 5:
+                    logger.debug(f"Upload progress: {pct}%")
+                    last_logged_pct = pct
 
     return response["id"]
 
 
+def _backoff_delay(backoff_seconds: float, attempt: int, max_backoff_seconds: float) -> float:
+    """Full-jitter exponential backoff for the given (1-based) attempt."""
+    return random.uniform(0, min(max_backoff_seconds, backoff_seconds * (2 ** (attempt - 1))))
+
+
+def _retry_after_seconds(resp) -> float:
+    """Seconds the server asked us to wait via Retry-After, or 0 if it didn't."""
+    value = resp.get("retry-after")
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
 def upload_with_retry(
     youtube,
     file_path: str,
@@ -234,56 +444,83 @@ def upload_with_retry(
     max_attempts: int,
     backoff_seconds: int,
     logger: logging.Logger,
+    chunk_size_mb: float = DEFAULT_CHUNK_SIZE_MB,
+    resumable_threshold_mb: float = DEFAULT_RESUMABLE_THRESHOLD_MB,
+    max_backoff_seconds: float = DEFAULT_MAX_BACKOFF_SECONDS,
+    file_size: Optional[int] = None,
 ) -> str:
-    """Upload video with exponential backoff retry logic."""
+    """Upload video with exponential backoff retry logic.
+
+    Waits are drawn uniformly from zero up to the exponential backoff (capped
+    at max_backoff_seconds), so clients that failed together don't retry in
+    lockstep. A server's Retry-After, up to the same cap, is waited out in full.
+    """
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    retryable_exceptions = (httplib2.HttpLib2Error, *RETRYABLE_EXCEPTIONS)
     last_error = None
 
     for attempt in range(1, max_attempts + 1):
         try:
             logger.info(f"Upload attempt {attempt}/{max_attempts}")
-            video_id = upload_video(youtube, file_path, title, description, privacy, logger)
+            video_id = upload_video(
+                youtube, file_path, title, description, privacy, logger,
+                chunk_size_mb, resumable_threshold_mb, file_size,
+            )
             logger.info(f"Upload successful! Video ID: {video_id}")
             return video_id
         except HttpError as e:
             last_error = e
-            if e.resp.status in [500, 502, 503, 504]:
-                wait_time = backoff_seconds * (2 ** (attempt - 1))
-                logger.warning(f"Server error ({e.resp.status}), retrying in {wait_time}s...")
+            if e.resp.status in RETRYABLE_STATUSES:
+                wait_time = max(
+                    min(_retry_after_seconds(e.resp), max_backoff_seconds),
+                    _backoff_delay(backoff_seconds, attempt, max_backoff_seconds),
+                )
+                logger.warning(f"Server error ({e.resp.status}), retrying in {wait_time:.1f}s...")
                 time.sleep(wait_time)
             else:
                 logger.error(f"HTTP error: {e}")
                 raise
-        except Exception as e:
+        except PERMANENT_OS_ERRORS:
+            raise
+        except retryable_exceptions as e:
             last_error = e
-            wait_time = backoff_seconds * (2 ** (attempt - 1))
-            logger.warning(f"Upload failed: {e}, retrying in {wait_time}s...")
+            wait_time = _backoff_delay(backoff_seconds, attempt, max_backoff_seconds)
+            logger.warning(f"Upload failed: {e}, retrying in {wait_time:.1f}s...")
             time.sleep(wait_time)
 
     logger.error(f"All {max_attempts} upload attempts failed")
     raise last_error
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Upload a clip to YouTube")
-    parser.add_argument("--file", required=True, help="Path to the video file")
-    parser.add_argument("--title", required=True, help="Video title")
-    parser.add_argument("--config", default=str(DEFAULT_CONFIG_PATH), help="Config file path")
-    args = parser.parse_args()
+def _is_auth_error(e: Exception) -> bool:
+    """Whether an upload failed because the cached credentials are no good."""
+    from google.auth.exceptions import RefreshError
+    from googleapiclient.errors import HttpError
 
-    config = load_config(Path(args.config))
-    logger = setup_logging(config["log_path"])
+    return isinstance(e, RefreshError) or (isinstance(e, HttpError) and e.resp.status == 401)
 
-    file_path = os.path.expanduser(args.file)
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
-        send_notification("Upload Failed", f"File not found: {file_path}", "critical")
-        sys.exit(1)
 
-    logger.info(f"Starting upload: {args.title}")
+def process_upload(
+    file: str, title: str, config: dict, config_path: Path, logger: logging.Logger
+) -> bool:
+    """Upload a single clip and notify the user. Returns True on success."""
+    file_path = os.path.expanduser(file)
+    try:
+        file_size = os.stat(file_path).st_size
+    except OSError as e:
+        # Any stat failure (missing, not a directory, no permission) fails
+        # just this clip; raising would kill the daemon and its queued jobs
+        logger.error(f"Cannot read {file_path}: {e.strerror}")
+        send_notification("Upload Failed", f"{e.strerror}: {file_path}", "critical")
+        return False
+
+    logger.info(f"Starting upload: {title}")
     logger.debug(f"File: {file_path}")
 
     description = config["youtube"]["description_template"].format(
-        date=datetime.now().strftime("%Y-%m-%d %H:%M")
+        date=time.strftime("%Y-%m-%d %H:%M")
     )
 
     try:
@@ -292,24 +529,90 @@ def main():
         video_id = upload_with_retry(
             youtube=youtube,
             file_path=file_path,
-            title=args.title,
+            file_size=file_size,
+            title=title,
             description=description,
             privacy=config["youtube"]["privacy"],
             max_attempts=config["retry"]["max_attempts"],
             backoff_seconds=config["retry"]["backoff_seconds"],
+            max_backoff_seconds=config["retry"].get(
+                "max_backoff_seconds", DEFAULT_MAX_BACKOFF_SECONDS
+            ),
             logger=logger,
+            chunk_size_mb=config["youtube"].get("chunk_size_mb", DEFAULT_CHUNK_SIZE_MB),
+            resumable_threshold_mb=config["youtube"].get(
+                "resumable_threshold_mb", DEFAULT_RESUMABLE_THRESHOLD_MB
+            ),
         )
 
         video_url = f"https://youtu.be/{video_id}"
         logger.info(f"Video URL: {video_url}")
-        send_notification_with_actions("Clip Uploaded!", video_url, video_url, logger)
+        spawn_notification_with_actions(video_url, config_path, logger)
+        return True
 
     except FileNotFoundError as e:
         send_notification("Upload Failed", str(e), "critical")
-        sys.exit(1)
+        return False
     except Exception as e:
         logger.exception("Upload failed")
+        if _is_auth_error(e):
+            # Rebuild from token_path next time, e.g. after auth_setup.py is rerun
+            get_youtube_service.cache_clear()
         send_notification("Upload Failed", str(e), "critical")
+        return False
+
+
+def run_daemon(config: dict, config_path: Path, logger: logging.Logger) -> None:
+    """Process upload jobs from stdin until it is closed.
+
+    Each line is a JSON object with "file" and "title" keys. Jobs run one
+    at a time; the daemon exits once stdin reaches EOF (e.g. OBS closed).
+    """
+    logger.info("Upload daemon started")
+    for line in iter(sys.stdin.readline, ""):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            file, title = job["file"], job["title"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed upload job {line!r}: {e}")
+            continue
+        process_upload(file, title, config, config_path, logger)
+    logger.info("Upload daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload a clip to YouTube")
+    parser.add_argument("--file", help="Path to the video file")
+    parser.add_argument("--title", help="Video title")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG_PATH), help="Config file path")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Read upload jobs as JSON lines from stdin instead of --file/--title",
+    )
+    # Internal: run the action notification for an uploaded clip, then exit
+    parser.add_argument("--notify-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not (args.daemon or args.notify_url) and not (args.file and args.title):
+        parser.error("--file and --title are required unless --daemon is given")
+
+    config_path = Path(args.config)
+    config = load_config(config_path)
+    logger = setup_logging(config["log_path"])
+
+    if args.notify_url:
+        send_notification_with_actions("Clip Uploaded!", args.notify_url, args.notify_url, logger)
+        return
+
+    if args.daemon:
+        run_daemon(config, config_path, logger)
+        return
+
+    if not process_upload(args.file, args.title, config, config_path, logger):
         sys.exit(1)
 
 